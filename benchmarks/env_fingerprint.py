@@ -0,0 +1,64 @@
+'''Time the check of whether the installed plugins changed
+
+    python benchmarks/env_fingerprint.py [plugins]
+
+Builds a throwaway site dir with a dist-info per plugin, each registering a
+``qiime2.plugins`` entry point, and times the fingerprint get_cache checks
+against the distribution versions it used to collect on every call.
+'''
+import os
+import sys
+import shutil
+import timeit
+import tempfile
+
+
+def make_site(dir, plugins):
+    site = os.path.join(dir, 'site-packages')
+    os.makedirs(os.path.join(dir, 'conda-meta'))
+    for idx in range(plugins):
+        name = f'q2_plugin{idx}'
+        info = os.path.join(site, f'{name}-2025.4.0.dist-info')
+        os.makedirs(info)
+        os.makedirs(os.path.join(site, name))
+        with open(os.path.join(info, 'METADATA'), 'w') as fh:
+            fh.write(f'Metadata-Version: 2.1\nName: {name}\n'
+                     'Version: 2025.4.0\n')
+        with open(os.path.join(info, 'entry_points.txt'), 'w') as fh:
+            fh.write(f'[qiime2.plugins]\n'
+                     f'{name} = {name}.plugin_setup:plugin\n')
+    return site
+
+
+def run(plugins):
+    import q2doc.cache as cache
+
+    dir = tempfile.mkdtemp()
+    try:
+        site = make_site(dir, plugins)
+        sys.path.insert(0, site)
+        prefix, site_dirs = sys.prefix, cache._site_dirs
+        sys.prefix, cache._site_dirs = dir, lambda: [site]
+        try:
+            timings = []
+            for check in (cache._env_fingerprint, cache._get_distro_versions):
+                runs, seconds = timeit.Timer(check).autorange()
+                timings.append(seconds / runs)
+            return timings
+        finally:
+            sys.prefix, cache._site_dirs = prefix, site_dirs
+            sys.path.remove(site)
+    finally:
+        shutil.rmtree(dir)
+
+
+def main():
+    plugins = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+
+    fingerprint, versions = run(plugins)
+    print(f'{plugins} plugins: {fingerprint * 1e6:.0f} us fingerprint,'
+          f' {versions * 1e6:.0f} us distribution versions')
+
+
+if __name__ == '__main__':
+    main()
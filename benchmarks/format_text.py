@@ -0,0 +1,52 @@
+'''Time format_text over the kinds of text plugin descriptions contain
+
+    python benchmarks/format_text.py
+
+Each text is formatted as is, and again tokenized by the regex format_text
+used before, which the tests keep as the reference for the scanner.
+'''
+import timeit
+
+TEXTS = {
+    'no trigger chars': 'A table of feature counts per sample.',
+    'prose with an h': 'The number of reads to subsample to, without'
+                       ' replacement, for each of the samples.',
+    'markup and a URL': 'Computes a ``FeatureTable[Frequency]`` from'
+                        ' *sequences*, see https://docs.qiime2.org/ for'
+                        ' **details**.',
+    '2 KB of prose': 'Samples with fewer reads than the sampling depth are'
+                     ' dropped from the table, which is then rarefied. ' * 20,
+    '8 KB, markup and URLs': 'see https://qiime2.org/a/b and `x` ' * 250,
+    '9 KB of open markers': ' *a' * 3000,
+}
+
+
+def time(text):
+    from q2doc.directives.common import format_text
+    runs, seconds = timeit.Timer(lambda: format_text(text)).autorange()
+    return seconds / runs
+
+
+def run():
+    from q2doc.directives import common
+    from q2doc.tests.test_format_text import scan_regex
+
+    times = {name: [time(text)] for name, text in TEXTS.items()}
+    scan = common._scan
+    common._scan = scan_regex
+    try:
+        for name, text in TEXTS.items():
+            times[name].append(time(text))
+    finally:
+        common._scan = scan
+    return times
+
+
+def main():
+    for name, (scan, regex) in run().items():
+        print(f'{name:<24} scanner {scan * 1e6:9.1f} us'
+              f'   regex {regex * 1e6:9.1f} us')
+
+
+if __name__ == '__main__':
+    main()
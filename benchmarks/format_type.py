@@ -0,0 +1,132 @@
+'''Time DescribeAction.format_type over a synthetic, parameter-heavy plugin
+
+    python benchmarks/format_type.py [actions] [params per action]
+
+Each action gets fresh type objects, as every QIIME 2 signature does, drawn
+from a small pool of type expressions. The types are stand-ins for the
+parts of qiime2 that format_type touches, so this runs without qiime2.
+'''
+import sys
+import time
+import types
+import random
+
+
+class FakePredicate:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __str__(self):
+        return f'{self.name}({self.args})'
+
+
+class FakeType:
+    def __init__(self, name, kind='semantic', fields=(), predicate=None,
+                 members=()):
+        self.name = name
+        self.kind = kind
+        self.fields = fields
+        self.predicate = predicate
+        self.members = members
+
+    def __str__(self):
+        if self.kind == 'union':
+            return ' | '.join(map(str, self.members))
+        text = self.name
+        if self.fields:
+            text += '[' + ', '.join(map(str, self.fields)) + ']'
+        if self.predicate:
+            text += f' % {self.predicate}'
+        return text
+
+    def __iter__(self):
+        yield self
+
+    def equals(self, other):
+        return str(self) == str(other)
+
+    def duplicate(self, predicate=None):
+        return FakeType(self.name, self.kind, self.fields, predicate)
+
+
+def install_fakes():
+    util = types.ModuleType('qiime2.sdk.util')
+    util.is_union = lambda t: t.kind == 'union'
+    util.is_primitive_type = lambda t: t.kind == 'primitive'
+    util.is_visualization_type = lambda t: t.kind == 'visualization'
+    util.is_collection_type = lambda t: t.kind == 'collection'
+    plugin = types.ModuleType('qiime2.plugin')
+    plugin.Str = types.SimpleNamespace(full_predicate=None)
+    sdk = types.ModuleType('qiime2.sdk')
+    sdk.util = util
+    qiime2 = types.ModuleType('qiime2')
+    qiime2.sdk, qiime2.plugin = sdk, plugin
+    sys.modules.update({'qiime2': qiime2, 'qiime2.sdk': sdk,
+                        'qiime2.sdk.util': util, 'qiime2.plugin': plugin})
+
+
+def make_type(seed):
+    '''One of a dozen or so type expressions, as a new object every time'''
+    rng = random.Random(seed)
+    prim = lambda name: FakeType(name, 'primitive')  # noqa: E731
+    choice = rng.randrange(6)
+    if choice == 0:
+        return FakeType('Int', 'primitive', predicate=FakePredicate(
+            'Range', f'{rng.randrange(4)}, None'))
+    if choice == 1:
+        return FakeType('List', 'collection', fields=(prim('Str'),))
+    if choice == 2:
+        return FakeType('FeatureTable', fields=(FakeType(
+            rng.choice(['Frequency', 'RelativeFrequency']), 'semantic'),))
+    if choice == 3:
+        choices = FakePredicate('Choices', repr(rng.choice(['auto', 'none'])))
+        return FakeType('union', 'union', members=(
+            prim('Float'), FakeType('Str', 'primitive', predicate=choices)))
+    if choice == 4:
+        return FakeType('Metadata', 'primitive')
+    return FakeType('Phylogeny', fields=(FakeType('Rooted', 'semantic'),))
+
+
+def run(actions, params):
+    from q2doc.directives.describe_action import DescribeAction
+
+    signatures = [[make_type(a * params + p) for p in range(params)]
+                  for a in range(actions)]
+
+    start = time.perf_counter()
+    DescribeAction._type_memo = {}
+    for signature in signatures:
+        for qiime_type in signature:
+            DescribeAction.format_type(qiime_type)
+    memo = time.perf_counter() - start
+
+    memoized = DescribeAction.__dict__['format_type']
+    DescribeAction.format_type = classmethod(
+        lambda cls, qiime_type, path=(): cls._format_type(qiime_type, path))
+    try:
+        start = time.perf_counter()
+        for signature in signatures:
+            for qiime_type in signature:
+                DescribeAction.format_type(qiime_type)
+        unmemo = time.perf_counter() - start
+    finally:
+        DescribeAction.format_type = memoized
+
+    return memo, unmemo
+
+
+def main():
+    install_fakes()
+
+    actions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    params = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    memo, unmemo = run(actions, params)
+    print(f'{actions * params} parameters:'
+          f' {memo * 1000:.1f} ms memoized,'
+          f' {unmemo * 1000:.1f} ms without the memo')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,14 +6,10 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+# Only click is imported up front, every command imports what it needs so
+# that `q2doc myst` and `--version` stay fast.
 import click
 import sys
-import json
-
-from q2doc.common import is_book, write_plugin, write_bibtex
-from q2doc.cache import get_cache
-from q2doc.directives import spec_directives, run_directive
-from q2doc.transforms import spec_transforms, run_transform
 
 
 ROOT_COMMAND_HELP = """\
@@ -34,9 +30,136 @@ def install(book):
     pass
 
 
+def plugin_options(func):
+    func = click.option(
+        '--exclude-plugin', '-x', 'exclude', multiple=True,
+        help='A plugin to leave out. Can be repeated.')(func)
+    func = click.option(
+        '--plugin', '-p', 'plugins', multiple=True,
+        help='A plugin to document, instead of every installed one. Can be'
+             ' repeated. Defaults to the q2doc section of myst.yml.')(func)
+    return func
+
+
+def get_selection(plugins, exclude, dir='.'):
+    '''The selection of the options, for this command only
+
+    Without any, the selection of the myst.yml in ``dir``, which is the one
+    the MyST build uses.
+    '''
+    from q2doc.cache import make_selection, read_config, read_selection
+    if not (plugins or exclude):
+        return read_selection(dir)
+
+    config = read_config(dir)
+    if 'plugins' in config or 'exclude-plugins' in config:
+        click.secho('Warning: the q2doc section of myst.yml selects the'
+                    ' plugins of the MyST build, not these options.',
+                    fg='yellow', err=True)
+    return make_selection(plugins, exclude)
+
+
 @root.command()
-def refresh_cache():
-    get_cache(refresh=True)
+@click.option('--jobs', '-j', type=int, default=None,
+              help='Number of processes to build with. Defaults to the'
+                   ' number of CPUs.')
+@plugin_options
+def refresh_cache(jobs, plugins, exclude):
+    from q2doc.cache import get_cache
+    get_cache(refresh=True, jobs=jobs,
+              selection=get_selection(plugins, exclude))
+
+
+@root.group()
+def cache():
+    """Manage the cache of rendered plugin references."""
+    pass
+
+
+@cache.command(name='export')
+@click.argument('file', type=click.Path(dir_okay=False))
+def export_(file):
+    """Bundle the cache, and the versions it was built for, into FILE."""
+    from q2doc.cache import export_cache
+    export_cache(file)
+
+
+@cache.command(name='import')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+def import_(file):
+    """Use the cache bundled in FILE by `q2doc cache export`."""
+    from q2doc.cache import import_cache
+    try:
+        import_cache(file)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+@cache.command(name='clear-usage')
+def clear_usage():
+    """Remove the stored results of usage examples, so all run again."""
+    from q2doc.transforms.usage_cache import clear
+    clear()
+
+
+@cache.command()
+def stats():
+    """Report the size, build time and load cost of the cache."""
+    from q2doc.cache import cache_stats
+    stats = cache_stats()
+
+    for directive, plugins in stats['handlers'].items():
+        click.secho(directive, bold=True)
+        click.echo(f'  {"plugin":<32} {"entries":>8} {"bytes":>12}'
+                   f' {"build (s)":>10}')
+        rows = sorted(plugins.items(), key=lambda r: r[1]['bytes'],
+                      reverse=True)
+        for plugin, row in rows:
+            build_time = row['build_time']
+            build_time = '-' if build_time is None else f'{build_time:.2f}'
+            click.echo(f'  {plugin:<32} {row["entries"]:>8}'
+                       f' {row["bytes"]:>12} {build_time:>10}')
+        click.echo(f'  {"total":<32}'
+                   f' {sum(r["entries"] for r in plugins.values()):>8}'
+                   f' {sum(r["bytes"] for r in plugins.values()):>12}')
+        click.echo()
+
+    mib = 1024 * 1024
+    click.echo(f'get_cache: {stats["load_time"] * 1000:.1f} ms,'
+               f' {stats["load_rss"] / mib:+.1f} MiB resident')
+    click.echo(f'all entries: {stats["read_time"] * 1000:.1f} ms,'
+               f' {stats["read_rss"] / mib:+.1f} MiB resident')
+    counters = stats['counters']
+    click.echo(f'directive calls: {counters.get("hits", 0)} hits,'
+               f' {counters.get("misses", 0)} misses;'
+               f' {counters.get("rebuilds", 0)} rebuilds')
+
+
+@root.command(name='check-xrefs')
+def check_xrefs():
+    """Report cross-references to targets no page of the cache defines."""
+    from q2doc.cache import check_xrefs
+    dangling = check_xrefs()
+
+    for id, directive, arg in dangling:
+        click.echo(f'{id}: referenced by {directive} {arg}')
+    if dangling:
+        raise click.ClickException(
+            f'{len(dangling)} cross-references to undefined targets')
+
+
+serve_help = """
+Run a server which keeps the cache and the QIIME 2 imports in memory.
+
+While it is running, `q2doc myst` forwards its requests to it instead of
+starting from scratch. Stop it with Ctrl-C.
+"""
+
+
+@root.command(help=serve_help)
+def serve():
+    from q2doc.server import serve
+    serve()
 
 
 myst_help = """
@@ -45,19 +168,47 @@ For use by the MyST documentation system.
 This is the implementation of the executable plugin for q2doc:
 
     https://mystmd.org/guide/executable-plugins
+
+With --batch, stdin is a JSON array of {directive, arg, options, node}
+objects and the result is the array of their ASTs.
 """
 
 @root.command(help=myst_help)
 @click.option('--directive', type=str, default=None)
 @click.option('--transform', type=str, default=None)
+@click.option('--batch', is_flag=True, default=False,
+              help='Resolve an array of directive requests.')
 @click.argument('stdin', required=False, type=click.File(), default=sys.stdin)
-def myst(directive, transform, stdin):
-    if directive:
-        result = run_directive(directive, json.load(stdin))
-    elif transform:
-        result = run_transform(transform, json.load(stdin))
+def myst(directive, transform, batch, stdin):
+    import json
+
+    if batch and (directive or transform):
+        raise click.UsageError(
+            '--batch cannot be combined with --directive or --transform')
+
+    if not (directive or transform or batch):
+        # the handshake of every myst worker, served from the stored spec
+        from q2doc.cache import read_spec
+        spec = read_spec()
+        if spec is not None:
+            print(json.dumps(spec, indent=2), flush=True, file=sys.stdout)
+            return
+
+    from q2doc.server import forward, dispatch
+
+    data = None
+    if directive or transform or batch:
+        data = json.load(stdin)
+
+    response = forward(directive=directive, transform=transform, data=data,
+                       batch=batch)
+    if response is None:
+        result = dispatch(directive=directive, transform=transform, data=data,
+                          batch=batch)
+    elif 'error' in response:
+        raise click.ClickException(response['error'])
     else:
-        result = dict(name='q2doc', **spec_directives(), **spec_transforms())
+        result = response['result']
 
     print(json.dumps(result, indent=2), flush=True, file=sys.stdout)
 
@@ -65,12 +216,23 @@ def myst(directive, transform, stdin):
 
 @root.command()
 @click.argument('book')
-def autodoc(book):
+@plugin_options
+def autodoc(book, plugins, exclude):
+    from q2doc.common import is_book, write_plugin, write_bibtex
+    from q2doc.cache import get_cache
+
     if not is_book(book):
         raise ValueError('book')
 
-    write_plugin(book, 'types')
-    write_bibtex(book, refresh=False)
+    from qiime2.sdk import PluginManager
+    selection = get_selection(plugins, exclude, book)
+    get_cache(selection=selection)
+    pm = PluginManager()
+
+    stats = write_plugin(book, 'types', pm=pm, selection=selection)
+    write_bibtex(book, pm=pm, stats=stats, selection=selection)
+    click.echo(f"{stats['written']} written, {stats['unchanged']} unchanged,"
+               f" {stats['deleted']} deleted")
 
 if __name__ == '__main__':
     root()
\ No newline at end of file
@@ -1,8 +1,11 @@
+import io
 import os
 import json
+import functools
 
 import click
 from q2doc import __version__
+from q2doc.util import map_tasks
 
 
 def get_app_dir():
@@ -30,6 +33,110 @@ def _get_distro_versions():
     return sorted(versions)
 
 
+def _spec_path():
+    return os.path.join(get_cache_dir(), 'spec.json')
+
+
+def read_spec():
+    '''The stored spec of the executable plugin, if it is for this version
+
+    Reading it imports none of the directive or transform handlers.
+    '''
+    try:
+        with open(_spec_path()) as fh:
+            stored = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    if stored.get('version') != __version__:
+        return None
+    return stored['spec']
+
+
+def write_spec():
+    '''Build the spec of the executable plugin and store it for `read_spec`
+    '''
+    from .directives import spec_directives
+    from .transforms import spec_transforms
+
+    spec = dict(name='q2doc', **spec_directives(), **spec_transforms())
+    path = _spec_path()
+    tmp = f'{path}.{os.getpid()}'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'w') as fh:
+            json.dump(dict(version=__version__, spec=spec), fh)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+    return spec
+
+
+def _site_dirs():
+    '''The directories packages are installed to'''
+    import site
+    import sysconfig
+    paths = sysconfig.get_paths()
+    return sorted({paths['purelib'], paths['platlib'],
+                   site.getusersitepackages()})
+
+
+def _path_dirs():
+    '''The site dirs and every other directory on sys.path'''
+    import sys
+    dirs = set(_site_dirs())
+    dirs.update(os.path.abspath(path or '.') for path in sys.path)
+    return sorted(path for path in dirs if os.path.isdir(path))
+
+
+def _env_fingerprint():
+    '''A cheap stamp of the installed packages
+
+    Only stats the env's conda-meta/ and the *.dist-info of the site dirs,
+    the user site and sys.path, any install, removal or upgrade touches one
+    of those.
+    '''
+    import sys
+    import hashlib
+
+    parts = [__version__]
+    for path in [os.path.join(sys.prefix, 'conda-meta'), *_site_dirs()]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f'{path}:{stat.st_ino}:{stat.st_mtime_ns}')
+
+    # other sys.path entries may be busy, only their dist-infos count
+    for path in _path_dirs():
+        try:
+            with os.scandir(path) as it:
+                entries = [e for e in it if e.name.endswith('.dist-info')]
+        except OSError:
+            continue
+        for entry in sorted(entries, key=lambda e: e.name):
+            stat = entry.stat()
+            parts.append(f'{path}/{entry.name}:{entry.inode()}'
+                         f':{stat.st_mtime_ns}')
+
+    return hashlib.sha1('\n'.join(parts).encode('utf8')).hexdigest()
+
+
+def _read_fingerprint(file):
+    if not os.path.exists(file):
+        return None
+    with open(file) as fh:
+        return fh.read().strip()
+
+
+def _write_fingerprint(file, stamp):
+    tmp = f'{file}.{os.getpid()}'
+    with open(tmp, 'w') as fh:
+        fh.write(f'{stamp}\n')
+    os.replace(tmp, file)
+
+
 def _read_requirements(file):
     '''Not a complete parser'''
     reqs = []
@@ -51,38 +158,787 @@ def _write_requirements(file, reqs):
             fh.write(f'{pkg}=={ver}\n')
 
 
-def _refresh_cache(file):
+def _changed_packages(last, curr):
+    last, curr = dict(last), dict(curr)
+    return {pkg for pkg in last.keys() | curr.keys()
+            if last.get(pkg) != curr.get(pkg)}
+
+
+def _shard_path(root, directive, plugin):
+    return os.path.join(root, directive, f'{plugin}.jsonl')
+
+
+# shorter subtrees cost more as a reference than they save
+_INTERN_MIN = 32
+
+
+def _intern(records):
+    '''Move the subtrees which repeat within a shard into a shared table
+
+    Every repeat is replaced with ``{"$": <position in the table>}``.
+    '''
+    keys = {}
+    counts = {}
+
+    def count(node):
+        key = json.dumps(node, sort_keys=True, separators=(',', ':'))
+        keys[id(node)] = key
+        counts[key] = counts.get(key, 0) + 1
+        for child in node.get('children', ()):
+            if type(child) is dict:
+                count(child)
+
+    def encode(node):
+        key = keys[id(node)]
+        if counts[key] < 2 or len(key) < _INTERN_MIN:
+            return encode_children(node)
+        if key not in positions:
+            positions[key] = len(table)
+            table.append(None)
+            table[positions[key]] = encode_children(node)
+        return {'$': positions[key]}
+
+    def encode_children(node):
+        if 'children' not in node:
+            return node
+        children = [encode(c) if type(c) is dict else c
+                    for c in node['children']]
+        return {**node, 'children': children}
+
+    for record in records.values():
+        for node in record:
+            count(node)
+
+    table = []
+    positions = {}
+    encoded = {arg: [encode(node) for node in record]
+               for arg, record in records.items()}
+    return table, encoded
+
+
+def _expand(node, table):
+    '''Undo `_intern`, every reference becomes a fresh copy'''
+    if '$' in node:
+        node = table[node['$']]
+    if 'children' not in node:
+        return dict(node)
+    children = [_expand(c, table) if type(c) is dict else c
+                for c in node['children']]
+    return {**node, 'children': children}
+
+
+def _heading_paths(ast, path=()):
+    '''Where the headings are, as indices into the nested children'''
+    paths = []
+    for idx, node in enumerate(ast):
+        if type(node) is not dict:
+            continue
+        if node['type'] == 'heading':
+            paths.append([*path, idx])
+        elif 'children' in node:
+            paths.extend(_heading_paths(node['children'], (*path, idx)))
+    return paths
+
+
+def _write_shard(root, directive, plugin, records):
+    '''Write the entries of one plugin as JSON lines
+
+    The first line is the table of interned subtrees, every other line is
+    one entry along with the locations of its headings. Returns
+    ``{arg: [plugin, offset, length]}`` for the key index.
+    '''
+    entries = {}
+    path = _shard_path(root, directive, plugin)
+    # the old file may be hard-linked into another generation
+    if os.path.exists(path):
+        os.remove(path)
+    if not records:
+        return entries
+
+    table, encoded = _intern(records)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(json.dumps(table, separators=(',', ':')).encode('utf8'))
+        fh.write(b'\n')
+        for arg, record in encoded.items():
+            record = dict(headings=_heading_paths(records[arg]), ast=record)
+            data = json.dumps(record, separators=(',', ':'))
+            data = data.encode('utf8') + b'\n'
+            entries[arg] = [plugin, fh.tell(), len(data)]
+            fh.write(data)
+
+    return entries
+
+
+def _iter_nodes(ast):
+    if type(ast) is list:
+        for node in ast:
+            yield from _iter_nodes(node)
+    elif type(ast) is dict:
+        yield ast
+        for node in ast.get('children', ()):
+            yield from _iter_nodes(node)
+
+
+def _target_owners(pm):
+    '''Which plugin defines each cross-reference target'''
+    from .directives.common import (type_to_id, format_to_id, plugin_to_id,
+                                    action_to_id)
+
+    owners = {}
+    for name, plugin in pm.plugins.items():
+        owners[plugin_to_id(plugin)] = name
+        for action in plugin.actions.values():
+            owners[action_to_id(action)] = name
+    for name, record in pm.artifact_classes.items():
+        owners[type_to_id(name)] = record.plugin.name
+    for name, record in pm.formats.items():
+        owners[format_to_id(name)] = record.plugin.name
+    return owners
+
+
+def _unlink_xrefs(ast, owners, excluded):
+    '''Replace references to targets of ``excluded`` plugins by their text'''
+    nodes = []
+    for node in ast:
+        if type(node) is dict:
+            if (node['type'] == 'crossReference'
+                    and owners.get(node['identifier']) in excluded):
+                nodes.extend(_unlink_xrefs(node['children'], owners, excluded))
+                continue
+            if 'children' in node:
+                node = {**node, 'children': _unlink_xrefs(
+                    node['children'], owners, excluded)}
+        nodes.append(node)
+    return nodes
+
+
+def make_selection(plugins=None, exclude=None):
+    '''Which plugins to document, all of them unless ``plugins`` are given'''
+    def names(plugins):
+        return sorted({name.replace('_', '-') for name in plugins})
+
+    return dict(plugins=names(plugins) if plugins else None,
+                exclude=names(exclude or ()))
+
+
+def read_config(dir='.'):
+    '''The ``q2doc`` section of a book's myst.yml, empty without one'''
+    try:
+        with open(os.path.join(dir, 'myst.yml')) as fh:
+            text = fh.read()
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+    if 'q2doc' not in text:
+        return {}
+
+    import yaml
+    return (yaml.safe_load(text) or {}).get('q2doc') or {}
+
+
+def read_selection(dir='.'):
+    '''The plugin selection of the ``q2doc`` section of a book's myst.yml::
+
+        q2doc:
+          plugins: [feature-table, diversity]
+          exclude-plugins: [...]
+
+    Without one, every plugin.
+    '''
+    config = read_config(dir)
+    return make_selection(config.get('plugins'),
+                          config.get('exclude-plugins'))
+
+
+def _selection_suffix(selection):
+    '''Tells the generations built for different selections apart'''
+    if selection == make_selection():
+        return ''
+    import hashlib
+    digest = hashlib.sha1(json.dumps(selection, sort_keys=True)
+                          .encode('utf8')).hexdigest()
+    return f'-{digest[:12]}'
+
+
+def select_plugins(plugins, selection=None):
+    '''The names in ``plugins`` which ``selection`` keeps'''
+    if selection is None:
+        return set(plugins)
+    return {name for name in plugins
+            if (selection['plugins'] is None or name in selection['plugins'])
+            and name not in selection['exclude']}
+
+
+def _plugin_package(plugin):
+    package = getattr(plugin, 'package', None) or ''
+    return package.split('.')[0]
+
+
+def _stale_plugins(pm, index, changed):
+    '''Plugins from a ``changed`` package, and the plugins depending on them
+    '''
+    known = index['plugins']
+    touched = {name for name, meta in known.items()
+               if meta['package'] in changed}
+    touched |= {name for name, plugin in pm.plugins.items()
+                if _plugin_package(plugin) in changed or name not in known}
+    touched |= known.keys() - pm.plugins.keys()
+
+    stale = touched & pm.plugins.keys()
+    for name, meta in known.items():
+        if name in pm.plugins and touched.intersection(meta['deps']):
+            stale.add(name)
+
+    return stale
+
+
+def _read_index(root):
+    with open(os.path.join(root, 'index.json')) as fh:
+        return json.load(fh)
+
+
+def _read_xrefs(root, strict=False):
+    '''The targets defined and referenced by each plugin and directive
+
+    As ``{plugin: {directive: {"defined": {id: arg},
+    "referenced": {id: [arg, ...]}}}}``, written next to the index by
+    `_refresh_cache`. Empty if the cache predates it, unless ``strict``.
+    '''
+    try:
+        with open(os.path.join(root, 'xrefs.json')) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        if strict:
+            raise
+        return {}
+
+
+def _xref_targets(records):
+    '''The identifiers each entry defines and the ones it references'''
+    defined, referenced = {}, {}
+    for arg, ast in records.items():
+        for node in _iter_nodes(ast):
+            if node['type'] == 'heading' and 'identifier' in node:
+                defined.setdefault(node['identifier'], arg)
+            elif node['type'] == 'crossReference':
+                referenced.setdefault(node['identifier'], []).append(arg)
+    return dict(defined=defined, referenced=referenced)
+
+
+def _build_shard(root, owners, excluded, directive, plugin):
+    '''Write the shard of one directive and plugin
+
+    References to the targets of ``excluded`` plugins become plain text.
+
+    Returns its key index entries, the targets it defines and references,
+    and how many seconds it took.
+    '''
+    import time
+    from qiime2.sdk import PluginManager
+    from .directives import HANDLERS
+
+    start = time.perf_counter()
+    pm = PluginManager.reuse_existing()
+    records = HANDLERS[directive].cache_all(pm, {plugin})[plugin]
+    if excluded:
+        records = {arg: _unlink_xrefs(ast, owners, excluded)
+                   for arg, ast in records.items()}
+    entries = _write_shard(root, directive, plugin, records)
+    seconds = time.perf_counter() - start
+
+    return entries, _xref_targets(records), seconds
+
+
+def _plugin_deps(plugin, xrefs, owners):
+    '''The plugins whose targets the shards of ``plugin`` reference'''
+    deps = {owners.get(id, plugin)
+            for targets in xrefs.get(plugin, {}).values()
+            for id in targets['referenced']}
+    deps.discard(plugin)
+    return deps
+
+
+def _caches_entries(handler):
+    '''Whether a directive handler has entries to cache at all'''
+    from .directives.common import DirectiveHandler
+    return (handler.cache_all.__func__
+            is not DirectiveHandler.cache_all.__func__
+            or handler.cache_plugin.__func__
+            is not DirectiveHandler.cache_plugin.__func__)
+
+
+def _refresh_cache(root, changed=None, jobs=None, selection=None):
+    '''Rebuild the shards of every plugin in the ``selection``
+
+    When the ``changed`` packages are known, only the plugins they provide
+    and their dependents are rebuilt, all other shards are kept as is. The
+    exception are the artifact class tables, which depend on the transformers
+    of every plugin, so all of those are rebuilt. Each directive and plugin
+    is built as a separate task over ``jobs`` processes.
+    '''
+    import shutil
     from qiime2.sdk import PluginManager
     from .directives import DIRECTIVES
-    ast = {}
 
     pm = PluginManager()
-    for handler in DIRECTIVES:
-        ast[handler.name] = handler.cache_all(pm)
-    with open(file, 'w') as fh:
-        json.dump(ast, fh, indent=2)
+    if selection is None:
+        selection = make_selection()
+    selected = select_plugins(pm.plugins, selection)
+
+    index = None
+    if changed is not None and 'q2doc' not in changed:
+        try:
+            index = _read_index(root)
+            xrefs = _read_xrefs(root, strict=True)
+        except Exception:
+            index = None
+    if index is not None and index.get('selection') != selection:
+        index = None
+
+    if index is None:
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root)
+        index = dict(entries={}, plugins={}, selection=selection)
+        xrefs = {}
+        stale = set(selected)
+    else:
+        stale = _stale_plugins(pm, index, changed) & selected
+
+    handlers = [handler for handler in DIRECTIVES if _caches_entries(handler)]
+    rebuild = {handler.name: set(stale) for handler in handlers}
+    if changed and 'describe-artifact' in rebuild:
+        rebuild['describe-artifact'] = set(selected)
+
+    removed = index['plugins'].keys() - selected
+    for directive in index['entries'].keys() - rebuild.keys():
+        del index['entries'][directive]
+    for handler in handlers:
+        entries = index['entries'].setdefault(handler.name, {})
+        for arg, (plugin, *_) in list(entries.items()):
+            if plugin in rebuild[handler.name] or plugin in removed:
+                del entries[arg]
+        for plugin in removed:
+            _write_shard(root, handler.name, plugin, {})
+
+    for plugin in stale | removed:
+        xrefs.pop(plugin, None)
+
+    tasks = [(directive, plugin)
+             for directive, plugins in rebuild.items()
+             for plugin in sorted(plugins)]
+    owners = _target_owners(pm)
+    build = functools.partial(_build_shard, root, owners,
+                              pm.plugins.keys() - selected)
+    build_time = {name: {} for name in stale}
+    for (directive, plugin), (entries, targets, seconds) in zip(
+            tasks, map_tasks(build, tasks, jobs)):
+        if plugin not in build_time:
+            # only some shards of the plugin were rebuilt, keep the rest
+            build_time[plugin] = dict(
+                index['plugins'][plugin]['build_time'])
+        index['entries'][directive].update(entries)
+        xrefs.setdefault(plugin, {})[directive] = targets
+        build_time[plugin][directive] = seconds
+
+    for plugin in removed:
+        del index['plugins'][plugin]
+    for plugin in build_time:
+        # from the targets of all its shards, so references that went away
+        # with a rebuilt one are dropped
+        index['plugins'][plugin] = dict(
+            package=_plugin_package(pm.plugins[plugin]),
+            deps=sorted(_plugin_deps(plugin, xrefs, owners)),
+            build_time=build_time[plugin])
+
+    with open(os.path.join(root, 'xrefs.json'), 'w') as fh:
+        json.dump(xrefs, fh)
+    with open(os.path.join(root, 'index.json'), 'w') as fh:
+        json.dump(index, fh)
+
+
+class ASTCache:
+    '''The key index of the cache, reading entries from their shard on demand
+    '''
+    def __init__(self, root):
+        self.root = root
+        index = _read_index(root)
+        self.index = index['entries']
+        self.selection = index.get('selection', make_selection())
+        self._tables = {}
+        self._entries = {}
+
+    def __contains__(self, directive):
+        return directive in self.index
+
+    def get(self, directive, arg):
+        '''The AST of an entry and the paths to its headings
+
+        Both are shared by every caller and must be treated as read-only.
+        '''
+        key = (directive, arg)
+        if key not in self._entries:
+            self._entries[key] = self._read(directive, arg)
+        return self._entries[key]
+
+    def read_all(self):
+        '''Read every entry ahead of time
+
+        Entries read in a forked child are lost with it, so a server reads
+        them all before forking for the first request.
+        '''
+        for directive, entries in self.index.items():
+            for arg in entries:
+                self.get(directive, arg)
+
+    def _read(self, directive, arg):
+        plugin, offset, length = self.index[directive][arg]
+        path = _shard_path(self.root, directive, plugin)
+        with open(path, 'rb') as fh:
+            if path not in self._tables:
+                self._tables[path] = json.loads(fh.readline())
+            fh.seek(offset)
+            record = json.loads(fh.read(length))
+        ast = [_expand(node, self._tables[path]) for node in record['ast']]
+        return ast, record['headings']
+
+
+_loaded = {}
+
+
+def _load_cache(link):
+    '''Reuse an already loaded index for as long as it is unchanged on disk
+
+    Only the generation ``link`` currently points to is kept, so a process
+    that outlives rebuilds does not hold on to the ones before.
+    '''
+    root = os.path.realpath(link)
+    stat = os.stat(os.path.join(root, 'index.json'))
+    stamp = (root, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if link in _loaded and _loaded[link][0] == stamp:
+        return _loaded[link][1]
+
+    cache = ASTCache(root)
+    _loaded[link] = (stamp, cache)
+    return cache
+
+
+def _refresh_lock(dir):
+    from flufl.lock import Lock
+    return Lock(os.path.join(dir, 'refresh.lock'), lifetime=60 * 60)
+
+
+def _link_generation(src, dst):
+    '''Start a generation from the shards of another one
+
+    Shards are hard-linked, `_write_shard` never writes into an existing file.
+    '''
+    import shutil
+    for dirpath, _, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        os.makedirs(target, exist_ok=True)
+        for fn in filenames:
+            if not fn.endswith('.jsonl'):
+                continue
+            try:
+                os.link(os.path.join(dirpath, fn), os.path.join(target, fn))
+            except OSError:
+                shutil.copy2(os.path.join(dirpath, fn), target)
+    shutil.copy2(os.path.join(src, 'index.json'), dst)
+    if os.path.exists(os.path.join(src, 'xrefs.json')):
+        shutil.copy2(os.path.join(src, 'xrefs.json'), dst)
+
+
+def _prune_generations(dir):
+    '''Remove all but the current generations and the previous one
+
+    There is a current generation for each plugin selection. The previous
+    one is kept for readers which loaded its index just before the switch.
+    '''
+    import shutil
+    current = {os.path.realpath(os.path.join(dir, fn))
+               for fn in os.listdir(dir) if fn.startswith('current')}
+    generations = [os.path.realpath(os.path.join(dir, fn))
+                   for fn in os.listdir(dir) if fn.startswith('gen-')
+                   and not fn.endswith('.link')]
+    generations.sort(key=os.path.getmtime, reverse=True)
+    old = [path for path in generations if path not in current]
+    for path in old[1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _counters_path():
+    return os.path.join(get_cache_dir(), 'stats.jsonl')
+
+
+_counts = {}
+
+
+def bump_counter(name):
+    '''Count a cache event, see `flush_counters`'''
+    if not _counts:
+        import atexit
+        atexit.register(flush_counters)
+    _counts[name] = _counts.get(name, 0) + 1
+
 
+def flush_counters():
+    '''Append the events counted by this process to the shared stats file
 
-def get_cache(refresh=False):
+    Each process appends one short line with O_APPEND, which needs no lock,
+    `_read_counters` adds them up.
+    '''
+    if not any(_counts.values()):
+        return
+    line = (json.dumps(_counts) + '\n').encode('utf8')
+    _counts.update(dict.fromkeys(_counts, 0))
+    try:
+        fd = os.open(_counters_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _read_counters():
+    counters = {}
+    try:
+        with open(_counters_path()) as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                for name, count in record.items():
+                    counters[name] = counters.get(name, 0) + count
+    except OSError:
+        pass
+    return counters
+
+
+def _switch_generation(dir, root, name='current'):
+    # an imported generation has the mtime of the archive, it is the newest
+    os.utime(root)
+    link = f'{root}.link'
+    os.symlink(os.path.basename(root), link)
+    os.replace(link, os.path.join(dir, name))
+    _prune_generations(dir)
+
+
+def _rebuild(dir, versions, last=None, jobs=None, selection=None):
+    '''Build a new generation of the cache and atomically make it current'''
+    import shutil
+    import tempfile
+
+    changed = None
+    if last:
+        changed = _changed_packages(last, versions)
+
+    os.makedirs(dir, exist_ok=True)
+    bump_counter('rebuilds')
+    name = 'current' + _selection_suffix(selection or make_selection())
+    current = os.path.join(dir, name)
+    root = tempfile.mkdtemp(prefix='gen-', dir=dir)
+    try:
+        if changed is not None and os.path.exists(current):
+            _link_generation(current, root)
+        _refresh_cache(root, changed, jobs, selection)
+        _write_requirements(os.path.join(root, 'requirements.txt'), versions)
+    except BaseException:
+        shutil.rmtree(root, ignore_errors=True)
+        raise
+
+    _switch_generation(dir, root, name)
+    write_spec()
+
+
+def _load_selected(root, selection):
+    cache = _load_cache(root)
+    if cache.selection != selection:
+        raise ValueError('the cache was built for other plugins')
+    return cache
+
+
+def get_cache(refresh=False, jobs=None, selection=None):
+    '''The cache for the installed plugins, built or updated as needed
+
+    Only the plugins in ``selection`` are documented, which defaults to the
+    one of the working directory, see `read_selection`. Each selection has
+    its own generations, so books selecting different plugins do not evict
+    each other.
+    '''
+    if selection is None:
+        selection = read_selection()
+    suffix = _selection_suffix(selection)
     dir = get_cache_dir()
-    reqs_fp = os.path.join(dir, 'requirements.txt')
-    cache_fp = os.path.join(dir, 'myst-ast.json')
+    cache_root = os.path.join(dir, 'current' + suffix)
+    reqs_fp = os.path.join(cache_root, 'requirements.txt')
+    stamp_fp = os.path.join(dir, 'fingerprint' + suffix)
 
-    curr = _get_distro_versions()
-    last = _read_requirements(reqs_fp)
+    # the full version scan is only needed once the environment was touched
+    stamp = _env_fingerprint()
+    if refresh or stamp != _read_fingerprint(stamp_fp):
+        curr = _get_distro_versions()
+        last = _read_requirements(reqs_fp)
 
-    if curr != last or refresh:
-        os.makedirs(dir, exist_ok=True)
-        _refresh_cache(cache_fp)
-        _write_requirements(reqs_fp, curr)
+        if curr != last or refresh:
+            os.makedirs(dir, exist_ok=True)
+            with _refresh_lock(dir):
+                # whoever held the lock before may have built it already
+                last_built = _read_requirements(reqs_fp)
+                if curr != last_built or (refresh and last_built == last):
+                    _rebuild(dir, curr, None if refresh else last_built,
+                             jobs, selection)
+        _write_fingerprint(stamp_fp, stamp)
 
     try:
-        with open(cache_fp) as fh:
-            ast = json.load(fh)
+        cache = _load_selected(cache_root, selection)
     except Exception:
-        _refresh_cache(cache_fp)
-        _write_requirements(reqs_fp, curr)
-        with open(cache_fp) as fh:
-            ast = json.load(fh)
+        os.makedirs(dir, exist_ok=True)
+        with _refresh_lock(dir):
+            try:
+                cache = _load_selected(cache_root, selection)
+            except Exception:
+                _rebuild(dir, _get_distro_versions(), jobs=jobs,
+                         selection=selection)
+                cache = _load_selected(cache_root, selection)
+
+    return cache
+
+
+def export_cache(file):
+    '''Write the current cache and the versions it was built for to a tarball
+    '''
+    import tarfile
+
+    cache = get_cache()
+    root = os.path.realpath(cache.root)
+    manifest = json.dumps(dict(
+        versions=_read_requirements(os.path.join(root, 'requirements.txt')),
+        selection=cache.selection))
+
+    with tarfile.open(file, 'w:gz') as tar:
+        info = tarfile.TarInfo('manifest.json')
+        info.size = len(manifest.encode('utf8'))
+        tar.addfile(info, io.BytesIO(manifest.encode('utf8')))
+        tar.add(root, arcname='cache')
+
+
+def import_cache(file):
+    '''Make the cache in a tarball from `export_cache` current
+
+    Raises ValueError if it is not such a tarball, or if it was built for
+    other versions than the ones installed or for another plugin selection
+    than the one of the working directory.
+    '''
+    import shutil
+    import tarfile
+    import tempfile
+
+    try:
+        tar = tarfile.open(file, 'r:*')
+    except tarfile.TarError:
+        raise ValueError(f'{file} is not a cache exported by q2doc')
+
+    with tar:
+        try:
+            manifest = json.load(tar.extractfile('manifest.json'))
+            versions = [tuple(pair) for pair in manifest['versions']]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'{file} is not a cache exported by q2doc')
+        curr = _get_distro_versions()
+        if versions != curr:
+            changed = sorted(_changed_packages(versions, curr))
+            raise ValueError(f'{file} was built for other versions of: '
+                             + ', '.join(changed))
+        selection = manifest.get('selection', make_selection())
+        if selection != read_selection():
+            raise ValueError(f'{file} was built for another selection of'
+                             f' plugins: {selection}')
+
+        dir = get_cache_dir()
+        os.makedirs(dir, exist_ok=True)
+        with _refresh_lock(dir):
+            tmp = tempfile.mkdtemp(prefix='import-', dir=dir)
+            try:
+                members = [m for m in tar.getmembers()
+                           if m.name == 'cache' or m.name.startswith('cache/')]
+                if hasattr(tarfile, 'data_filter'):
+                    tar.extractall(tmp, members, filter='data')
+                else:
+                    tar.extractall(tmp, members)
+                root = tempfile.mkdtemp(prefix='gen-', dir=dir)
+                os.rmdir(root)
+                os.rename(os.path.join(tmp, 'cache'), root)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+            _switch_generation(dir, root,
+                               'current' + _selection_suffix(selection))
+
+
+def check_xrefs():
+    '''Cross-references in the cache whose target nothing defines
+
+    Returns them as ``(id, directive, arg)``, sorted.
+    '''
+    cache = get_cache()
+    xrefs = _read_xrefs(cache.root)
+
+    defined = set()
+    for directives in xrefs.values():
+        for targets in directives.values():
+            defined.update(targets['defined'])
+
+    dangling = []
+    for directives in xrefs.values():
+        for directive, targets in directives.items():
+            for id, args in targets['referenced'].items():
+                if id not in defined:
+                    dangling.extend((id, directive, arg) for arg in args)
+
+    return sorted(dangling)
+
+
+def cache_stats():
+    '''What the cache costs, per directive handler and plugin
+
+    Loads the cache and every entry in it to measure the load time and the
+    resident memory that takes.
+    '''
+    import time
+    import psutil
+
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    start = time.perf_counter()
+    cache = get_cache()
+    load_time = time.perf_counter() - start
+    load_rss = process.memory_info().rss - rss
+
+    start = time.perf_counter()
+    entries = [cache.get(directive, arg)
+               for directive in cache.index for arg in cache.index[directive]]
+    read_time = time.perf_counter() - start
+    read_rss = process.memory_info().rss - rss - load_rss
+    del entries
+
+    index = _read_index(cache.root)
+    handlers = {}
+    for directive, entries in index['entries'].items():
+        plugins = handlers[directive] = {}
+        for plugin, *_ in entries.values():
+            if plugin not in plugins:
+                meta = index['plugins'].get(plugin, {})
+                plugins[plugin] = dict(
+                    entries=0,
+                    bytes=os.path.getsize(
+                        _shard_path(cache.root, directive, plugin)),
+                    build_time=meta.get('build_time', {}).get(directive))
+            plugins[plugin]['entries'] += 1
 
-    return ast
\ No newline at end of file
+    return dict(handlers=handlers, load_time=load_time, load_rss=load_rss,
+                read_time=read_time, read_rss=read_rss,
+                counters=_read_counters())
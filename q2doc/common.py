@@ -1,22 +1,83 @@
 import os
+import collections
 
 from q2doc.directives.common import plugin_to_id, action_to_id, format_to_id
 import q2doc.myst as md
-from .cache import get_cache
+from .cache import get_cache, select_plugins
 
 def is_book(dir):
     return os.path.isdir(dir) and os.path.isfile(os.path.join(dir, 'myst.yml'))
 
 
-def write_bibtex(dir, refresh=True):
-    _ = get_cache(refresh=refresh)
+def _sync_file(path, content, stats):
+    '''Write ``content`` unless the file already has it, keeping its mtime'''
+    try:
+        with open(path) as fh:
+            unchanged = fh.read() == content
+    except FileNotFoundError:
+        unchanged = False
+
+    if unchanged:
+        stats['unchanged'] += 1
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fh:
+        fh.write(content)
+    stats['written'] += 1
+
+
+def _prune_pages(root, pages, stats):
+    '''Delete the pages under ``root`` an earlier run wrote but this one did
+    not, pages written by hand are left alone'''
+    import json
+    manifest = os.path.join(root, '.q2doc-pages.json')
+    try:
+        with open(manifest) as fh:
+            written = json.load(fh)
+    except (OSError, ValueError):
+        written = []
+
+    current = sorted(os.path.relpath(path, root) for path in pages
+                     if path.startswith(os.path.join(root, '')))
+    for rel in set(written) - set(current):
+        path = os.path.join(root, rel)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        stats['deleted'] += 1
+        parent = os.path.dirname(path)
+        while parent != root and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+
+    if current != written:
+        os.makedirs(root, exist_ok=True)
+        with open(manifest, 'w') as fh:
+            json.dump(current, fh, indent=1)
+
+
+def _selected(pm, selection):
+    names = select_plugins(pm.plugins, selection)
+    return {name: plugin for name, plugin in pm.plugins.items()
+            if name in names}
 
-    from qiime2.sdk import PluginManager, Citations
-    pm = PluginManager()
 
+def write_bibtex(dir, refresh=True, pm=None, stats=None, selection=None):
+    if stats is None:
+        stats = collections.Counter()
+    if pm is None:
+        _ = get_cache(refresh=refresh, selection=selection)
+
+        from qiime2.sdk import PluginManager
+        pm = PluginManager()
+
+    import tempfile
+    from qiime2.sdk import Citations
 
     citations = Citations()
-    for plugin in pm.plugins.values():
+    for plugin in _selected(pm, selection).values():
         for idx, entry in enumerate(plugin.citations):
             citations[f'{plugin_to_id(plugin)}-{idx}'] = entry
         for action in plugin.actions.values():
@@ -25,59 +86,74 @@ def write_bibtex(dir, refresh=True):
         for view in plugin.views.values():
             for idx, entry in enumerate(view.citations):
                 citations[f'{format_to_id(view.name)}-{idx}'] = entry
-    citations.save(os.path.join(dir, 'q2doc.bib'))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        citations.save(os.path.join(tmp, 'q2doc.bib'))
+        with open(os.path.join(tmp, 'q2doc.bib')) as fh:
+            content = fh.read()
+    _sync_file(os.path.join(dir, 'q2doc.bib'), content, stats)
+
+    return stats
 
 
-def write_plugin(dir, plugin_name, root_dir='plugin-reference'):
-    _ = get_cache(refresh=True)
+def write_plugin(dir, plugin_name, root_dir='plugin-reference', pm=None,
+                 stats=None, selection=None):
+    if stats is None:
+        stats = collections.Counter()
+    if pm is None:
+        _ = get_cache(refresh=True, selection=selection)
 
-    from qiime2.sdk import PluginManager
-    pm = PluginManager()
+        from qiime2.sdk import PluginManager
+        pm = PluginManager()
 
     root = os.path.join(dir, root_dir)
-    os.makedirs(root, exist_ok=True)
+    plugins = _selected(pm, selection)
+    pages = {}
 
     action_root = os.path.join(root, 'plugins')
-    os.makedirs(action_root, exist_ok=True)
-    for name, plugin in pm.plugins.items():
+    for name, plugin in plugins.items():
         plugin_root = os.path.join(action_root, name)
-        os.makedirs(plugin_root, exist_ok=True)
-        with open(os.path.join(plugin_root, 'index.md'), 'w') as fh:
-            fh.write(md.frontmatter_yml(title="Plugin Overview"))
-            fh.write(md.directive_md('describe-plugin', name))
+        pages[os.path.join(plugin_root, 'index.md')] = (
+            md.frontmatter_yml(title="Plugin Overview")
+            + md.directive_md('describe-plugin', name))
 
         if not plugin.actions:
             continue
 
         for idx, action in enumerate(plugin.actions):
             action = action.replace('_', '-')
-            with open(os.path.join(plugin_root, f'{idx}-{action}.md'), 'w') as fh:
-                fh.write(md.frontmatter_yml(title=action))
-                fh.write(md.directive_md('describe-action', f'{name} {action}'))
+            pages[os.path.join(plugin_root, f'{idx}-{action}.md')] = (
+                md.frontmatter_yml(title=action)
+                + md.directive_md('describe-action', f'{name} {action}'))
 
     artifacts_root = os.path.join(root, 'artifacts')
-    os.makedirs(artifacts_root, exist_ok=True)
-
-    with open(os.path.join(artifacts_root, 'classes.md'), 'w') as fh:
-        fh.write('# Artifact Classes\n\n')
-        for name, plugin in pm.plugins.items():
-            if not plugin.artifact_classes:
-                continue
-
-            fh.write(f'## __[{name}](#{plugin_to_id(plugin)})__\n\n')
-            fh.write('---\n\n')
-            for key in plugin.artifact_classes:
-                fh.write(md.directive_md('describe-artifact', key, depth=3))
-            fh.write('\n---\n\n')
-
-    with open(os.path.join(artifacts_root, 'formats.md'), 'w') as fh:
-        fh.write('# Formats\n\n')
-        for name, plugin in pm.plugins.items():
-            if not plugin.formats:
-                continue
-
-            fh.write(f'## __[{name}](#{plugin_to_id(plugin)})__\n\n')
-            fh.write('---\n\n')
-            for key in plugin.formats:
-                fh.write(md.directive_md('describe-format', key, depth=3))
-            fh.write('\n---\n\n')
\ No newline at end of file
+
+    content = '# Artifact Classes\n\n'
+    for name, plugin in plugins.items():
+        if not plugin.artifact_classes:
+            continue
+
+        content += f'## __[{name}](#{plugin_to_id(plugin)})__\n\n'
+        content += '---\n\n'
+        for key in plugin.artifact_classes:
+            content += md.directive_md('describe-artifact', key, depth=3)
+        content += '\n---\n\n'
+    pages[os.path.join(artifacts_root, 'classes.md')] = content
+
+    content = '# Formats\n\n'
+    for name, plugin in plugins.items():
+        if not plugin.formats:
+            continue
+
+        content += f'## __[{name}](#{plugin_to_id(plugin)})__\n\n'
+        content += '---\n\n'
+        for key in plugin.formats:
+            content += md.directive_md('describe-format', key, depth=3)
+        content += '\n---\n\n'
+    pages[os.path.join(artifacts_root, 'formats.md')] = content
+
+    for path, content in pages.items():
+        _sync_file(path, content, stats)
+    _prune_pages(action_root, pages, stats)
+
+    return stats
@@ -1,4 +1,4 @@
-from q2doc.cache import get_cache
+from q2doc.cache import get_cache, bump_counter
 
 from .describe_action import DescribeAction
 from .describe_artifact import DescribeArtifact
@@ -21,16 +21,31 @@ def spec_directives():
     return dict(directives=[d.as_spec() for d in DIRECTIVES])
 
 
-def run_directive(directive, data):
-    cache = get_cache()
+def run_directive(directive, data, cache=None):
+    if cache is None:
+        cache = get_cache()
     arg = data.get('arg')
     options = data['options']
     node = data['node']
 
     if arg is None:
-        ast = None
+        ast, headings = None, []
     else:
-        ast = cache[directive][arg]
-    ast = HANDLERS[directive].apply_options(ast, node, **options)
+        try:
+            ast, headings = cache.get(directive, arg)
+        except KeyError:
+            bump_counter('misses')
+            raise
+        bump_counter('hits')
+    ast = HANDLERS[directive].apply_options(ast, node, headings, **options)
 
     return ast
+
+
+def run_directives(requests, cache=None):
+    '''Resolve many ``{directive, arg, options, node}`` requests at once'''
+    if cache is None:
+        cache = get_cache()
+
+    return [run_directive(request['directive'], request, cache=cache)
+            for request in requests]
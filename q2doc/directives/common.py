@@ -11,13 +11,70 @@ class DirectiveHandler:
                     arg=dict(type='string', doc=cls.arg_help),
                     options=cls.get_options())
 
+    @classmethod
+    def cache_all(cls, pm, plugins=None):
+        '''Entries grouped by the plugin which registered them'''
+        ast = {}
+
+        for plugin_name, plugin in pm.plugins.items():
+            if plugins is not None and plugin_name not in plugins:
+                continue
+            ast[plugin_name] = cls.cache_plugin(pm, plugin)
+
+        return ast
+
+    @classmethod
+    def cache_plugin(cls, pm, plugin):
+        return {}
+
     @classmethod
     def get_options(cls):
         return {}
 
     @classmethod
-    def apply_options(cls, ast, node, **options):
+    def apply_options(cls, ast, node, headings, **options):
+        '''Tailor a cached entry to one use of the directive
+
+        ``ast`` is shared by every request for the entry, so it must not be
+        changed in place, see `shift_headings` and `drop_heading`.
+        '''
+        return ast
+
+
+def _replace_at(ast, path, replace):
+    '''A copy of ``ast``, the node at ``path`` replaced by ``replace(node)``
+
+    Only the lists and nodes on the way to it are copied, everything else is
+    shared with ``ast``, which is left as it was.
+    '''
+    idx, *rest = path
+    siblings = list(ast)
+    node = siblings[idx]
+    if rest:
+        node = {**node, 'children': _replace_at(node['children'], rest,
+                                                replace)}
+    else:
+        node = replace(node)
+    siblings[idx] = node
+    return siblings
+
+
+def shift_headings(ast, headings, depth):
+    '''Put the top heading at ``depth``, keeping the rest relative to it'''
+    if depth == 1:
         return ast
+    for path in headings:
+        ast = _replace_at(ast, path, lambda heading: {
+            **heading, 'depth': depth + (heading['depth'] - 1)})
+    return ast
+
+
+def drop_heading(ast, headings):
+    '''Replace the top heading with a target, so it can still be linked'''
+    if headings:
+        ast = _replace_at(ast, headings[0],
+                          lambda heading: md.target_ast(heading['label']))
+    return ast
 
 
 def type_to_id(semantic_type):
@@ -41,16 +98,28 @@ def plugin_to_id(plugin):
     return f'q2-plugin-{plugin}'
 
 
-regex = re.compile(r"""
-  (?:^|\W)
-  (?P<outer>                     # match inside word break
-    (?P<type>``|`|__|\*\*|\*|_)  # capture type
-      (?P<content>.*?)           # lazy match content
-    (?P=type)                    # force closing type
-  )
-  (?:\W|$)
-|                                           # Alternative
-  (?P<url>
+style_map = {
+    '__': 'strong',
+    '**': 'strong',
+    '_': 'emphasis',
+    '*': 'emphasis',
+    '`': 'inlineCode',
+    '``': 'inlineCode',
+    None: 'link'
+}
+# tried in this order, a doubled marker before the single one
+_markers = ('``', '`', '__', '**', '*', '_')
+# lookaheads, so that overlapping occurrences are all found
+_closing = {marker: re.compile(r'(?=%s(?!\w))' % re.escape(marker))
+            for marker in _markers}
+_newline = re.compile('\n')
+# without any of these there is nothing to format
+_triggers = ('`', '_', '*', 'h')
+# markup can only open right after a non-word character, which puts the
+# candidate one before the marker, or at the start of the text
+_candidate = re.compile(r'(?:^|\W)[`_*]|https?://')
+# anchored at each candidate, so it never rescans the rest of the text
+_url = re.compile(r"""
     https?:\/\/(?:[-a-zA-Z0-9-]{1,256}\.)+[a-z]{2,15}     # host
     (?::\d+)?                                             # port
     (?:
@@ -59,37 +128,97 @@ regex = re.compile(r"""
     |
       \/                                                  # empty path
     )?
-  )
 """, re.VERBOSE)
 
-style_map = {
-    '__': 'strong',
-    '**': 'strong',
-    '_': 'emphasis',
-    '*': 'emphasis',
-    '`': 'inlineCode',
-    '``': 'inlineCode',
-    None: 'link'
-}
+
+def _is_word(char):
+    return char.isalnum() or char == '_'
+
+
+def _next(pattern, text, start, found):
+    '''Where ``pattern`` next matches from ``start`` on, or the text's end
+
+    ``found`` keeps the last search for each pattern. It answers every later
+    one which starts no further on than its result, so as the scan moves
+    forward the text is searched through once per pattern.
+    '''
+    last = found.get(pattern)
+    if last is None or not last[0] <= start <= last[1]:
+        match = pattern.search(text, start)
+        last = (start, len(text) if match is None else match.start())
+        found[pattern] = last
+    return last[1]
+
+
+def _scan_markup(text, pos, found):
+    '''Markup opening at ``pos``, as ``(marker, content start, closing)``
+
+    It closes at the first marker on the same line which ends a word.
+    '''
+    for marker in _markers:
+        if text.startswith(marker, pos):
+            content = pos + len(marker)
+            # both are the end of the text when there is none
+            close = _next(_closing[marker], text, content, found)
+            if close < _next(_newline, text, content, found):
+                return marker, content, close
+    return None
+
+
+def _scan_url(text, pos):
+    '''The end of an http(s) URL starting at ``pos``, if there is one'''
+    match = _url.match(text, pos)
+    return None if match is None else match.end()
+
+
+def _scan(text):
+    '''Yield ``(start, end, style, content)`` for every markup and URL'''
+    searches = {}
+
+    pos = 0
+    while True:
+        candidate = _candidate.search(text, pos)
+        if candidate is None:
+            return
+        pos = candidate.start()
+
+        found = None
+        if pos == 0:
+            found = _scan_markup(text, 0, searches)
+        if found is None and not _is_word(text[pos]):
+            found = _scan_markup(text, pos + 1, searches)
+
+        if found is not None:
+            marker, content, close = found
+            end = close + len(marker)
+            yield (content - len(marker), end, style_map[marker],
+                   text[content:close])
+            # the non-word character after the closing marker is consumed
+            pos = end + 1 if end < len(text) else end
+            continue
+
+        end = _scan_url(text, pos)
+        if end is not None:
+            yield pos, end, style_map[None], text[pos:end]
+            pos = end
+            continue
+
+        pos += 1
+
+
 def format_text(text):
+    for trigger in _triggers:
+        if trigger in text:
+            break
+    else:
+        return [md.text_ast(text)] if text else []
+
     ast = []
     plain_start = 0
-    for match in regex.finditer(text):
-        start, end = match.span('outer')
-        if start == -1 and end == -1:
-            start, end = match.span('url')
-        assert start >= 0 and end >= 0
-
+    for start, end, style, content in _scan(text):
         ast.append(md.text_ast(text[plain_start:start]))
         plain_start = end
 
-        style = style_map[match.group('type')]
-        content = match.group('content')
-        if content is None:
-            content = match.group('url')
-            if content is None:
-                continue
-
         if style == 'inlineCode':
             ast.append(md.inline_code_ast(content))
         elif style == 'link':
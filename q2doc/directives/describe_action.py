@@ -1,7 +1,7 @@
-import inspect
 import textwrap
 import q2doc.myst as md
-from .common import DirectiveHandler, type_to_id, format_text, action_to_id, plugin_to_id, format_citations
+from .common import (DirectiveHandler, type_to_id, format_text, action_to_id,
+                     plugin_to_id, format_citations, drop_heading)
 
 
 class DescribeAction(DirectiveHandler):
@@ -10,19 +10,38 @@ class DescribeAction(DirectiveHandler):
     arg_help = 'Format as: <plugin-name> <action-name>'
 
     @classmethod
-    def cache_all(cls, pm):
+    def cache_plugin(cls, pm, plugin):
         ast = {}
 
-        for plugin_name, plugin in pm.plugins.items():
-            for action_name, action in plugin.actions.items():
-                action_name = action.id.replace('_', '-')
-                name = ' '.join([plugin_name, action_name])
-                ast[name] = cls.format_record(name, action, plugin)
+        for action_name, action in plugin.actions.items():
+            action_name = action.id.replace('_', '-')
+            name = ' '.join([plugin.name, action_name])
+            ast[name] = cls.format_record(name, action, plugin)
 
         return ast
 
+    # rendered types by their canonical string, shared by the actions of one
+    # build and dropped after it, as a server outlives many builds
+    _type_memo = {}
+
+    @classmethod
+    def cache_all(cls, pm, plugins=None):
+        cls._type_memo = {}
+        try:
+            return super().cache_all(pm, plugins)
+        finally:
+            cls._type_memo = {}
+
     @classmethod
     def format_type(cls, qiime_type, path=()):
+        key = (str(qiime_type), path)
+        if key not in cls._type_memo:
+            cls._type_memo[key] = cls._format_type(qiime_type, path)
+        # callers extend the list, the nodes themselves are never modified
+        return list(cls._type_memo[key])
+
+    @classmethod
+    def _format_type(cls, qiime_type, path=()):
         import qiime2.sdk.util as util
         from qiime2.plugin import Str
         null_predicate = Str.full_predicate
@@ -164,9 +183,8 @@ class DescribeAction(DirectiveHandler):
         }
 
     @classmethod
-    def apply_options(cls, ast, node, skip_heading=False):
+    def apply_options(cls, ast, node, headings, skip_heading=False):
         if skip_heading:
-            heading = ast[0]
-            ast[0] = md.target_ast(heading['label'])
+            ast = drop_heading(ast, headings)
         return ast
 
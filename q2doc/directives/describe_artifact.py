@@ -1,5 +1,6 @@
 import q2doc.myst as md
-from .common import DirectiveHandler, type_to_id, format_to_id, plugin_to_id, format_paragraphs
+from .common import (DirectiveHandler, type_to_id, format_to_id, plugin_to_id,
+                     format_paragraphs, shift_headings)
 
 class DescribeArtifact(DirectiveHandler):
     """A directive to describe a QIIME 2 artifact class."""
@@ -7,17 +8,51 @@ class DescribeArtifact(DirectiveHandler):
     arg_help = 'Format as: <Semantic[Type]>'
 
     @classmethod
-    def cache_all(cls, pm):
+    def cache_all(cls, pm, plugins=None):
+        views = cls.index_views(pm, plugins)
         ast = {}
 
-        for name, record in pm.artifact_classes.items():
-            ast[name] = cls.format_record(name, record)
+        for plugin_name, plugin in pm.plugins.items():
+            if plugins is not None and plugin_name not in plugins:
+                continue
+            ast[plugin_name] = {
+                name: cls.format_record(name, record, views[name])
+                for name, record in plugin.artifact_classes.items()}
 
         return ast
 
     @classmethod
-    def format_record(cls, name, record):
-        from qiime2.sdk import PluginManager
+    def index_views(cls, pm, plugins=None):
+        '''Map each semantic type to ``{format: (importable, exportable)}``
+
+        The views only depend on the formats registered for a type, so types
+        sharing those formats share one walk of the transformer graph.
+        '''
+        from qiime2.sdk.util import parse_type
+
+        by_formats = {}
+        views = {}
+        for name, record in pm.artifact_classes.items():
+            if plugins is not None and record.plugin.name not in plugins:
+                continue
+
+            semantic_type = parse_type(name)
+            key = tuple(tf.format for tf in pm.type_formats
+                        if semantic_type <= tf.type_expression)
+            if key not in by_formats:
+                importable = pm.get_formats(filter='IMPORTABLE',
+                                            semantic_type=name)
+                exportable = pm.get_formats(filter='EXPORTABLE',
+                                            semantic_type=name)
+                by_formats[key] = {
+                    fmt: (fmt in importable, fmt in exportable)
+                    for fmt in sorted(importable.keys() | exportable.keys())}
+            views[name] = by_formats[key]
+
+        return views
+
+    @classmethod
+    def format_record(cls, name, record, views):
         header = md.heading_ast(1, md.inline_code_ast(name), id=type_to_id(name))
         ast = format_paragraphs(record.description)
         # ast.append(md.kv_list_ast({
@@ -26,13 +61,10 @@ class DescribeArtifact(DirectiveHandler):
         #                                    id=format_to_id(record.format))
         #     }))
 
-        rows = []
-        pm = PluginManager.reuse_existing()
-        all_formats = pm.get_formats(semantic_type=name)
-        importable = pm.get_formats(filter='IMPORTABLE', semantic_type=name)
-        exportable = pm.get_formats(filter='EXPORTABLE', semantic_type=name)
-        rows = [[md.cross_reference_ast(md.inline_code_ast(name), id=format_to_id(name)), '✔' if name in importable else '', '✔' if name in exportable else '']
-                for name in all_formats]
+        rows = [[md.cross_reference_ast(md.inline_code_ast(name),
+                                        id=format_to_id(name)),
+                 '✔' if importable else '', '✔' if exportable else '']
+                for name, (importable, exportable) in views.items()]
 
         ast.append(md.definition_list_ast([
             (md.kv_header_ast('plugin', md.cross_reference_ast(record.plugin.id.replace('_', '-'), id=plugin_to_id(record.plugin))), None),
@@ -52,11 +84,5 @@ class DescribeArtifact(DirectiveHandler):
         }
 
     @classmethod
-    def apply_options(cls, ast, node, depth=1):
-        for node in ast:
-            if node['type'] == 'heading':
-                node['depth'] = depth + (node['depth'] - 1)
-            elif 'children' in node:
-                for child in node['children']:
-                    cls.apply_options([child], depth)
-        return ast
+    def apply_options(cls, ast, node, headings, depth=1):
+        return shift_headings(ast, headings, depth)
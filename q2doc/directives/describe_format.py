@@ -1,5 +1,6 @@
 import q2doc.myst as md
-from .common import DirectiveHandler, format_paragraphs, format_to_id, plugin_to_id
+from .common import (DirectiveHandler, format_paragraphs, format_to_id,
+                     plugin_to_id, shift_headings)
 
 class DescribeFormat(DirectiveHandler):
     """A directive to describe a QIIME 2 file/directory format."""
@@ -7,10 +8,10 @@ class DescribeFormat(DirectiveHandler):
     arg_help = 'Format as: <FileFormat>'
 
     @classmethod
-    def cache_all(cls, pm):
+    def cache_plugin(cls, pm, plugin):
         ast = {}
 
-        for name, record in pm.formats.items():
+        for name, record in plugin.formats.items():
             ast[name] = cls.format_record(name, record)
 
         return ast
@@ -63,7 +64,5 @@ class DescribeFormat(DirectiveHandler):
         }
 
     @classmethod
-    def apply_options(cls, ast, node, depth=1):
-        heading = ast[0]
-        heading['depth'] = depth
-        return ast
\ No newline at end of file
+    def apply_options(cls, ast, node, headings, depth=1):
+        return shift_headings(ast, headings, depth)
@@ -1,5 +1,7 @@
 import q2doc.myst as md
-from .common import DirectiveHandler, format_paragraphs, format_text, plugin_to_id, action_to_id, type_to_id, format_to_id, format_citations
+from .common import (DirectiveHandler, format_paragraphs, format_text,
+                     plugin_to_id, action_to_id, type_to_id, format_to_id,
+                     format_citations, shift_headings)
 
 class DescribePlugin(DirectiveHandler):
     """A directive to describe a QIIME 2 plugin's available types and actions."""
@@ -7,13 +9,8 @@ class DescribePlugin(DirectiveHandler):
     arg_help = 'Format as: <plugin>'
 
     @classmethod
-    def cache_all(cls, pm):
-        ast = {}
-
-        for name, plugin in pm.plugins.items():
-            ast[name] = cls.format_record(name, plugin)
-
-        return ast
+    def cache_plugin(cls, pm, plugin):
+        return {plugin.name: cls.format_record(plugin.name, plugin)}
 
     @classmethod
     def format_record(cls, name, plugin):
@@ -74,7 +71,5 @@ class DescribePlugin(DirectiveHandler):
         }
 
     @classmethod
-    def apply_options(cls, ast, node, depth=1):
-        heading = ast[0]
-        heading['depth'] = depth
-        return ast
\ No newline at end of file
+    def apply_options(cls, ast, node, headings, depth=1):
+        return shift_headings(ast, headings, depth)
@@ -7,10 +7,6 @@ class DescribeUsage(DirectiveHandler):
     name = 'describe-usage'
     arg_help = 'No arguments'
 
-    @classmethod
-    def cache_all(cls, pm):
-        return None
-
     @classmethod
     def get_options(cls):
         return {
@@ -21,7 +17,7 @@ class DescribeUsage(DirectiveHandler):
         }
 
     @classmethod
-    def apply_options(cls, ast, node, scope=None):
+    def apply_options(cls, ast, node, headings, scope=None):
         ast = md.code_ast('python', node['value'])
         ast['data'] = dict(deferred=True, scope=scope, source='describe-usage')
         return [ast]
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import types
 import urllib
 
 def _build_url(data_dir, fn):
@@ -12,4 +13,36 @@ def _build_url(data_dir, fn):
     parts = list(urllib.parse.urlparse(baseurl))
     parts[2] += '/'.join([str(data_dir), str(fn)])
     url = urllib.parse.urlunparse(parts)
-    return url
\ No newline at end of file
+    return url
+
+
+def code_names(code):
+    '''Every global name ``code`` refers to, including in nested code'''
+    names = set()
+    todo = [code]
+    while todo:
+        code = todo.pop()
+        names.update(code.co_names)
+        todo.extend(const for const in code.co_consts
+                    if isinstance(const, types.CodeType))
+    return names
+
+
+class BlockLineage:
+    '''Records which variables of its scope each usage block writes
+
+    What a block reads is known before it runs, see `code_names`.
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lineage = []
+
+    def exec_block(self, source):
+        before = dict(self.scope)
+        try:
+            exec(compile(source, '<usage>', 'exec'), self.scope)
+        finally:
+            writes = [name for name, value in self.scope.items()
+                      if name != '__builtins__'
+                      and (name not in before or before[name] is not value)]
+            self.lineage.append(dict(writes=sorted(writes)))
@@ -0,0 +1,53 @@
+from qiime2.sdk.usage import Usage
+
+import q2doc.myst as md
+
+from .common import BlockLineage
+
+
+class MystDraftUsage(BlockLineage, Usage):
+    '''Stands in for MystExecUsage in draft builds, executing nothing
+
+    Where the results would be listed, a placeholder is rendered instead.
+    '''
+    def __init__(self, data_dir, auto_collect_size):
+        super().__init__()
+        self.scope = dict(use=self)
+        self.placeholder = False
+
+    def render(self, flush=False, **kwargs):
+        ast = []
+        if self.placeholder:
+            ast.append(md.admonition_ast(
+                'This is a draft build, the example was not run.',
+                'Results omitted', 'note'))
+
+        if flush:
+            self.placeholder = False
+
+        return ast
+
+    def init_artifact(self, name, factory):
+        self.placeholder = True
+        return super().init_artifact(name, factory)
+
+    def init_metadata(self, name, factory):
+        self.placeholder = True
+        return super().init_metadata(name, factory)
+
+    def init_format(self, name, factory, ext=None):
+        self.placeholder = True
+        return super().init_format(name, factory, ext=ext)
+
+    def import_from_format(self, name, semantic_type, variable,
+                           view_type=None):
+        self.placeholder = True
+        return super().import_from_format(
+            name, semantic_type, variable, view_type=view_type)
+
+    def action(self, action, input_opts, output_opts):
+        self.placeholder = True
+        return super().action(action, input_opts, output_opts)
+
+    def peek(self, variable):
+        self.placeholder = True
@@ -14,7 +14,7 @@ from q2cli.core.usage import CLIUsage, CLIUsageVariable
 
 import q2doc.myst as md
 
-from .common import _build_url
+from .common import _build_url, BlockLineage
 
 
 
@@ -25,7 +25,7 @@ class MystExecUsageVariable(ExecutionUsageVariable, CLIUsageVariable):
     pass
 
 
-class MystExecUsage(Usage):
+class MystExecUsage(BlockLineage, Usage):
     def __init__(self, data_dir, auto_collect_size):
         super().__init__()
         self.scope = dict(use=self)
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import socket
+import socketserver
+
+from q2doc.cache import get_cache_dir, read_selection
+
+
+def get_socket_path():
+    import hashlib
+    # one server per environment, even where they share the click app dir
+    env = hashlib.sha1(os.fsencode(sys.prefix)).hexdigest()[:12]
+    path = os.path.join(get_cache_dir(), f'q2doc-{env}.sock')
+    # sun_path is limited to 108 bytes, deep conda prefixes can exceed that
+    if len(os.fsencode(path)) >= 100:
+        import tempfile
+        digest = hashlib.sha1(os.fsencode(path)).hexdigest()[:16]
+        path = os.path.join(tempfile.gettempdir(), f'q2doc-{os.getuid()}',
+                            f'{digest}.sock')
+    return path
+
+
+def _is_own_socket(path):
+    '''Whether ``path`` is a socket of this user, in a directory nobody else
+    can write to'''
+    import stat
+    try:
+        sock = os.lstat(path)
+        parent = os.lstat(os.path.dirname(path))
+    except OSError:
+        return False
+    return (stat.S_ISSOCK(sock.st_mode) and sock.st_uid == os.getuid()
+            and stat.S_ISDIR(parent.st_mode)
+            and parent.st_uid == os.getuid()
+            and not parent.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def dispatch(directive=None, transform=None, data=None, cache=None,
+             batch=False):
+    if batch:
+        from q2doc.directives import run_directives
+        return run_directives(data, cache=cache)
+    elif directive:
+        from q2doc.directives import run_directive
+        return run_directive(directive, data, cache=cache)
+    elif transform:
+        from q2doc.transforms import run_transform
+        return run_transform(transform, data)
+    else:
+        from q2doc.cache import read_spec, write_spec
+        return read_spec() or write_spec()
+
+
+def _recv_all(sock):
+    chunks = []
+    while chunk := sock.recv(65536):
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def forward(directive=None, transform=None, data=None, batch=False):
+    '''Send a request to a running server
+
+    Returns None when there is no server to talk to, otherwise the response,
+    which holds either a ``result`` or an ``error``.
+    '''
+    path = get_socket_path()
+    # the request carries the whole environment, never hand it to a stranger
+    if not _is_own_socket(path):
+        return None
+
+    message = dict(directive=directive, transform=transform, data=data,
+                   batch=batch, cwd=os.getcwd(), env=dict(os.environ))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            sock.sendall(json.dumps(message).encode('utf8'))
+            sock.shutdown(socket.SHUT_WR)
+            response = _recv_all(sock)
+        except OSError:
+            return None
+
+    if not response:
+        return None
+    return json.loads(response)
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # this runs in a forked child, so the parent's state is untouched
+        message = json.loads(_recv_all(self.request))
+        try:
+            os.chdir(message['cwd'])
+            os.environ.clear()
+            os.environ.update(message['env'])
+            cache = self.server.cache
+            # a book may select other plugins than the server's working dir
+            selection = read_selection()
+            if cache is None or cache.selection != selection:
+                from q2doc.cache import get_cache
+                cache = get_cache(selection=selection)
+            result = dict(result=dispatch(message['directive'],
+                                          message['transform'],
+                                          message['data'],
+                                          cache=cache,
+                                          batch=message['batch']))
+        except Exception:
+            import traceback
+            result = dict(error=traceback.format_exc())
+        self.request.sendall(json.dumps(result).encode('utf8'))
+        # forked children leave with os._exit, which skips atexit
+        from q2doc.cache import flush_counters
+        flush_counters()
+
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    '''Keeps the imports and the cache of one environment resident
+
+    Every request is handled in a fork of this process, so it starts with
+    everything already loaded.
+    '''
+    def __init__(self, path):
+        self.cache = None
+        self.warm()
+        super().__init__(path, RequestHandler)
+
+    def warm(self):
+        from qiime2.sdk import PluginManager
+        import q2doc.directives  # noqa: F401
+        import q2doc.transforms  # noqa: F401
+        import q2doc.drivers.execution  # noqa: F401
+
+        PluginManager()
+        self.refresh()
+
+    def refresh(self):
+        from q2doc.cache import get_cache
+        cache = get_cache()
+        if cache is not self.cache:
+            cache.read_all()
+        self.cache = cache
+
+    def process_request(self, request, client_address):
+        # pick up environment changes before handing the cache to a child,
+        # if that fails the child retries on its own and reports the error
+        try:
+            self.refresh()
+        except Exception:
+            self.cache = None
+        # or the child would count the parent's events again
+        from q2doc.cache import flush_counters
+        flush_counters()
+        super().process_request(request, client_address)
+
+
+def serve():
+    path = get_socket_path()
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if os.path.lexists(path):
+        if forward() is not None:
+            raise RuntimeError(
+                f'A q2doc server is already listening on {path}')
+        os.unlink(path)
+
+    with Server(path) as server:
+        try:
+            if not _is_own_socket(path):
+                raise RuntimeError(f'{os.path.dirname(path)} is writable by'
+                                   ' other users, clients would not trust it')
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
@@ -0,0 +1,83 @@
+import re
+import random
+import unittest
+
+from q2doc.directives.common import _scan, format_text, style_map
+
+# what format_text used to tokenize with, quadratic on long lines
+regex = re.compile(r"""
+  (?:^|\W)
+  (?P<outer>                     # match inside word break
+    (?P<type>``|`|__|\*\*|\*|_)  # capture type
+      (?P<content>.*?)           # lazy match content
+    (?P=type)                    # force closing type
+  )
+  (?:\W|$)
+|                                           # Alternative
+  (?P<url>
+    https?:\/\/(?:[-a-zA-Z0-9-]{1,256}\.)+[a-z]{2,15}     # host
+    (?::\d+)?                                             # port
+    (?:
+      \/?[-a-zA-Z0-9@:%_+~#?&/=.]*                        # path with
+         [-a-zA-Z0-9@:%_+~#?&/=]                          # non-trailing punc.
+    |
+      \/                                                  # empty path
+    )?
+  )
+""", re.VERBOSE)
+
+
+def scan_regex(text):
+    '''As `_scan`, by the regex'''
+    for match in regex.finditer(text):
+        if match.group('type') is not None:
+            start, end = match.span('outer')
+            yield (start, end, style_map[match.group('type')],
+                   match.group('content'))
+        else:
+            start, end = match.span('url')
+            yield start, end, style_map[None], match.group('url')
+
+
+class TestScan(unittest.TestCase):
+    '''The linear scanner has to agree with the regex it replaced'''
+    def assertSameScan(self, text):
+        self.assertEqual(list(_scan(text)), list(scan_regex(text)),
+                         repr(text))
+
+    def test_random_text(self):
+        rng = random.Random(7)
+        chars = 'ab_*`h: /.\n-tps1Aé'
+        for _ in range(50000):
+            text = ''.join(rng.choice(chars)
+                           for _ in range(rng.randrange(25)))
+            self.assertSameScan(text)
+
+    def test_descriptions(self):
+        for text in [
+                'Filter features from a table based on `frequency` and/or'
+                ' metadata, see https://docs.qiime2.org/2024.10/plugins/'
+                ' for **details**.',
+                'The sampling depth to use (e.g., _n_ reads per sample).'
+                ' Samples with less than __n__ reads are dropped. See'
+                ' http://example.com:8080/a/b.html.',
+                'Computes a ``FeatureTable[Frequency]`` from *sequences*.',
+                'snake_case_names and 2*3*4 are left alone',
+                'http://a.b. https://x.y.org:/ http://no-tld/ `a\nb`',
+                'plain text with nothing to do', '']:
+            self.assertSameScan(text)
+
+    def test_long_line(self):
+        # every marker is left open, which the regex takes quadratic time on
+        text = ' *a' * 3000 + ' `b` https://qiime2.org.'
+        self.assertSameScan(text)
+        self.assertEqual([style for _, _, style, _ in _scan(text)],
+                         ['inlineCode', 'link'])
+
+    def test_long_text(self):
+        text = 'see https://qiime2.org and `x` ' * 100
+        self.assertEqual(len(format_text(text)), 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import q2doc.directives
+from q2doc.cache import _refresh_cache, _read_index, _read_xrefs
+from q2doc.directives.common import DirectiveHandler, type_to_id
+
+
+BUILT = []
+
+
+class FakeHandler(DirectiveHandler):
+    '''An entry per type of the plugin, referencing the plugin's refs'''
+    name = 'describe-fake'
+    refs = 'refs'
+
+    @classmethod
+    def cache_plugin(cls, pm, plugin):
+        BUILT.append((cls.name, plugin.name))
+        refs = [dict(type='crossReference', identifier=type_to_id(ref),
+                     children=[])
+                for ref in getattr(plugin, cls.refs)]
+        return {f'{cls.name}:{type}': [
+            dict(type='heading', depth=1, identifier=type_to_id(type),
+                 children=[]),
+            dict(type='paragraph', children=refs)]
+            for type in plugin.types}
+
+
+class FakeArtifactHandler(FakeHandler):
+    name = 'describe-artifact'
+    refs = 'artifact_refs'
+
+
+class NoEntriesHandler(DirectiveHandler):
+    name = 'describe-nothing'
+
+
+def make_pm(**plugins):
+    '''``name=(package, types, refs[, artifact refs])`` for each plugin'''
+    pm = types.SimpleNamespace(plugins={}, artifact_classes={}, formats={})
+    for name, (package, types_, refs, *artifact_refs) in plugins.items():
+        plugin = types.SimpleNamespace(
+            name=name, id=name, package=package, actions={}, types=types_,
+            refs=refs, artifact_refs=artifact_refs[0] if artifact_refs else [])
+        pm.plugins[name] = plugin
+        for type in types_:
+            pm.artifact_classes[type] = types.SimpleNamespace(plugin=plugin)
+    return pm
+
+
+class TestRefreshCache(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = os.path.join(tmp.name, 'gen')
+        self.pm = None
+
+        handlers = [FakeHandler, FakeArtifactHandler, NoEntriesHandler]
+        plugin_manager = mock.Mock(side_effect=lambda: self.pm)
+        plugin_manager.reuse_existing.side_effect = lambda: self.pm
+        for patch in [
+                mock.patch('qiime2.sdk.PluginManager', plugin_manager),
+                mock.patch.object(q2doc.directives, 'DIRECTIVES', handlers),
+                mock.patch.dict(q2doc.directives.HANDLERS,
+                                {h.name: h for h in handlers}, clear=True)]:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def refresh(self, changed=None, **plugins):
+        self.pm = make_pm(**plugins)
+        BUILT.clear()
+        _refresh_cache(self.root, changed, jobs=1)
+        return sorted(BUILT)
+
+    def index(self):
+        return _read_index(self.root)
+
+    def args(self, directive='describe-fake'):
+        return sorted(self.index()['entries'][directive])
+
+    def test_version_bump(self):
+        plugins = dict(a=('q2_a', ['A'], []), b=('q2_b', ['B'], []))
+        self.refresh(**plugins)
+
+        # artifact tables depend on every plugin, the rest only on their own
+        self.assertEqual(self.refresh({'q2_a'}, **plugins), [
+            ('describe-artifact', 'a'), ('describe-artifact', 'b'),
+            ('describe-fake', 'a')])
+        self.assertEqual(self.args(), ['describe-fake:A', 'describe-fake:B'])
+
+        # the build times of the shards that were kept are kept too
+        build_time = self.index()['plugins']['b']['build_time']
+        self.assertEqual(sorted(build_time),
+                         ['describe-artifact', 'describe-fake'])
+
+    def test_dependents_are_rebuilt(self):
+        plugins = dict(a=('q2_a', ['A'], []), b=('q2_b', ['B'], ['A']),
+                       c=('q2_c', ['C'], []))
+        self.refresh(**plugins)
+        self.assertEqual(self.index()['plugins']['b']['deps'], ['a'])
+
+        built = self.refresh({'q2_a'}, **plugins)
+        self.assertIn(('describe-fake', 'b'), built)
+        self.assertNotIn(('describe-fake', 'c'), built)
+
+    def test_removed_plugin(self):
+        self.refresh(a=('q2_a', ['A'], []), b=('q2_b', ['B'], []),
+                     c=('q2_c', ['C'], ['B']))
+
+        built = self.refresh({'q2_b'}, a=('q2_a', ['A'], []),
+                             c=('q2_c', ['C'], ['B']))
+        self.assertIn(('describe-fake', 'c'), built)
+        self.assertNotIn(('describe-fake', 'a'), built)
+        self.assertEqual(self.args(), ['describe-fake:A', 'describe-fake:C'])
+        self.assertEqual(sorted(self.index()['plugins']), ['a', 'c'])
+        self.assertNotIn('b', _read_xrefs(self.root))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'describe-fake', 'b.jsonl')))
+
+    def test_new_plugin(self):
+        self.refresh(a=('q2_a', ['A'], []))
+
+        built = self.refresh({'q2_b'}, a=('q2_a', ['A'], []),
+                             b=('q2_b', ['B'], ['A']))
+        self.assertEqual(built, [('describe-artifact', 'a'),
+                                 ('describe-artifact', 'b'),
+                                 ('describe-fake', 'b')])
+        self.assertEqual(self.args(), ['describe-fake:A', 'describe-fake:B'])
+        self.assertEqual(self.index()['plugins']['b']['deps'], ['a'])
+
+    def test_deps_of_a_partial_rebuild(self):
+        self.refresh(a=('q2_a', ['A'], []), b=('q2_b', ['B'], [], ['A']),
+                     c=('q2_c', ['C'], []))
+        self.assertEqual(self.index()['plugins']['b']['deps'], ['a'])
+
+        # only the artifact shard of b is rebuilt, and no longer refers to a
+        built = self.refresh({'q2_c'}, a=('q2_a', ['A'], []),
+                             b=('q2_b', ['B'], []), c=('q2_c', ['C'], []))
+        self.assertNotIn(('describe-fake', 'b'), built)
+        self.assertEqual(self.index()['plugins']['b']['deps'], [])
+
+    def test_handlers_without_entries_are_skipped(self):
+        self.refresh(a=('q2_a', ['A'], []))
+        self.assertEqual(sorted(self.index()['entries']),
+                         ['describe-artifact', 'describe-fake'])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'describe-nothing')))
+
+    def test_unchanged_entries_are_kept(self):
+        plugins = dict(a=('q2_a', ['A'], []), b=('q2_b', ['B'], ['A']))
+        self.refresh(**plugins)
+        with open(os.path.join(self.root, 'index.json')) as fh:
+            before = json.load(fh)['entries']['describe-fake']
+
+        self.refresh({'q2_c'}, **plugins)
+        self.assertEqual(self.index()['entries']['describe-fake'], before)
+
+
+if __name__ == '__main__':
+    unittest.main()
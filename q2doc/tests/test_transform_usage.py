@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from q2doc.drivers.common import BlockLineage
+from q2doc.transforms.transform_usage import TransformUsage
+
+
+class StubUsage(BlockLineage):
+    '''Runs blocks in a plain scope and renders nothing'''
+    def __init__(self, ran):
+        super().__init__()
+        self.scope = dict(use=self)
+        self.ran = ran
+
+    def exec_block(self, source):
+        self.ran.append(source)
+        super().exec_block(source)
+
+    def render(self, flush=False):
+        return []
+
+
+def usage(source):
+    return dict(type='code', value=source,
+                data=dict(source='describe-usage'))
+
+
+class TestRenderScope(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+        for patch in [
+                mock.patch.dict(os.environ, {'Q2DOC_DRAFT': '0'}),
+                mock.patch('q2doc.cache.get_app_dir',
+                           return_value=os.path.join(self.tmp.name, 'app')),
+                mock.patch('q2doc.transforms.usage_cache._manifest',
+                           return_value='[]'),
+                mock.patch.object(
+                    TransformUsage, 'init_drivers',
+                    lambda transform: (StubUsage(self.ran), []))]:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def render(self, *sources, line=1):
+        '''Render ``sources`` as one scope, as a fresh build would'''
+        self.ran = []
+        transform = TransformUsage()
+        nodes = [usage(src) for src in sources]
+        for node in nodes:
+            node['position'] = dict(start=dict(line=line))
+        self.blocks = transform.render_scope('scope', nodes)
+        self.scope = transform.ctx['scope'][0].scope
+        return self.ran
+
+    def test_first_build_runs_everything(self):
+        self.assertEqual(self.render('a = 1', 'b = a + 1'),
+                         ['a = 1', 'b = a + 1'])
+        self.assertEqual(self.scope['b'], 2)
+
+    def test_unchanged_blocks_are_reused(self):
+        self.render('a = 1', 'b = a + 1')
+        self.assertEqual(self.render('a = 1', 'b = a + 1'), [])
+
+    def test_changed_independent_block(self):
+        self.render('a = 1', 'b = 2', 'c = a')
+        self.assertEqual(self.render('a = 1', 'b = 3', 'c = a'), ['b = 3'])
+
+    def test_changed_producer(self):
+        self.render('x = 1', 'y = x + 1', 'z = 5')
+        self.assertEqual(self.render('x = 2', 'y = x + 1', 'z = 5'),
+                         ['x = 2', 'y = x + 1'])
+        self.assertEqual(self.scope['y'], 3)
+
+    def test_rebound_variable(self):
+        self.render('x = 1', 'x = x + 1', 'y = x')
+        self.assertEqual(self.render('x = 1', 'x = x + 1', 'y = x * 10'),
+                         ['x = 1', 'x = x + 1', 'y = x * 10'])
+        self.assertEqual(self.scope['y'], 20)
+
+    def test_producer_rebinding_an_input(self):
+        sources = ['a = 1; b = 1', 'b = 2', 'c = a', 'd = b + c']
+        self.render(*sources)
+        # the b of the first block has to be rebound by the second
+        self.assertEqual(self.render(*sources[:3], 'd = b * c'),
+                         ['a = 1; b = 1', 'b = 2', 'c = a', 'd = b * c'])
+        self.assertEqual(self.scope['d'], 2)
+
+    def test_hit_followed_by_miss(self):
+        self.render('a = 1', 'b = a + 1')
+        # the hit binds nothing, so the miss has to run its producer first
+        self.assertEqual(self.render('a = 1', 'b = a + 2'),
+                         ['a = 1', 'b = a + 2'])
+        self.assertEqual(self.scope['b'], 3)
+
+    def test_hit_shows_the_current_node(self):
+        self.render('a = 1', line=1)
+        self.assertEqual(self.render('a = 1', line=7), [])
+        tabset = self.blocks[0]['children'][0]
+        source, = tabset['children'][-1]['children']
+        self.assertEqual(source['position'], dict(start=dict(line=7)))
+
+    def test_failed_block_is_not_stored(self):
+        self.render('a = undefined')
+        self.assertEqual(self.render('a = undefined'), ['a = undefined'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,7 @@
 from .transform_usage import TransformUsage
-from flufl.lock import Lock
 import os
-import psutil
-import random
+import json
+import contextlib
 
 TRANSFORMS = [
     TransformUsage
@@ -15,10 +14,83 @@ def spec_transforms():
     return dict(transforms=[t.as_spec() for t in TRANSFORMS])
 
 
+def _n_slots():
+    import psutil
+    return max(psutil.cpu_count() - 1, 1)
+
+
+def _try_slot(name, slot, dir):
+    '''The fd holding ``slot``, or None if another process holds it'''
+    import fcntl
+
+    fd = os.open(os.path.join(dir, f'q2doc-{name}.{slot}'),
+                 os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    os.ftruncate(fd, 0)
+    os.write(fd, f'{os.getpid()}\n'.encode())
+    return fd
+
+
+@contextlib.contextmanager
+def _slot(name, n_slots, dir='.locks', poll=0.1):
+    '''Hold any free one of ``n_slots`` slots, waiting until one is free
+
+    A slot is an flock on its file, so the kernel frees it as soon as the
+    holder exits, however it exits. The file names the holder's PID. How
+    long each wait took is appended to ``waits.jsonl``.
+    '''
+    import time
+
+    os.makedirs(dir, exist_ok=True)
+    start = time.monotonic()
+    while True:
+        for slot in range(n_slots):
+            fd = _try_slot(name, slot, dir)
+            if fd is not None:
+                break
+        else:
+            time.sleep(poll)
+            continue
+        break
+
+    waited = time.monotonic() - start
+    try:
+        with open(os.path.join(dir, 'waits.jsonl'), 'a') as fh:
+            fh.write(json.dumps(dict(transform=name, slot=slot,
+                                     pid=os.getpid(), wait=waited,
+                                     time=time.time())) + '\n')
+        yield slot
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def _spare_slots(name, n_slots, wanted, dir='.locks'):
+    '''Hold up to ``wanted`` more slots, of those free right now
+
+    Yields how many it got, which may be none. For a transform that runs
+    in several processes, on top of the slot it already holds.
+    '''
+    os.makedirs(dir, exist_ok=True)
+    fds = []
+    try:
+        for slot in range(n_slots):
+            if len(fds) >= wanted:
+                break
+            fd = _try_slot(name, slot, dir)
+            if fd is not None:
+                fds.append(fd)
+        yield len(fds)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
 def run_transform(name, ast):
-    n_jobs = max(psutil.cpu_count() - 1, 1)
-    group = random.randrange(0, n_jobs)
-    os.makedirs('.locks', exist_ok=True)
-    with Lock(os.path.join('.locks/', f'q2doc-{name}.{group}'), lifetime=60 * 60 * 3):
+    with _slot(name, _n_slots()):
         transform = HANDLERS[name]()
-        return transform.run(ast)
\ No newline at end of file
+        return transform.run(ast)
@@ -12,6 +12,21 @@ def is_usage(node):
 
 AUTO_COLLECT = 4
 
+
+def is_draft(dir='.'):
+    '''Whether to skip executing examples, by Q2DOC_DRAFT or myst.yml::
+
+        q2doc:
+          draft: true
+    '''
+    env = os.environ.get('Q2DOC_DRAFT')
+    if env is not None:
+        return env.lower() not in ('', '0', 'false', 'no')
+
+    from q2doc.cache import read_config
+    return bool(read_config(dir).get('draft'))
+
+
 class TransformUsage(Transform):
     name = 'transform-usage'
     help = 'Render a usage example'
@@ -21,6 +36,7 @@ class TransformUsage(Transform):
         self.error = None
         self.ctx = {}
         self.drivers = []
+        self.draft = is_draft()
 
 
     def init_drivers(self):
@@ -43,15 +59,14 @@ class TransformUsage(Transform):
         from q2doc.drivers.r import MystRtifactUsage
         drivers.append(dict(name='[R API]', sync='r', driver=MystRtifactUsage(self.scope)))
 
+        if self.draft:
+            from q2doc.drivers.draft import MystDraftUsage
+            return (MystDraftUsage(self.scope, AUTO_COLLECT), drivers)
         return (MystExecUsage(self.scope, AUTO_COLLECT), drivers)
 
-    def setup_scope(self, node):
-        scope = node['data'].get('scope')
-        if self.scope is None and scope is None:
-            raise Exception('No initial scope defined.')
-
-        if scope is not None:
-            self.scope = os.path.join('data', scope)
+    def setup_scope(self, scope):
+        if self.scope != scope:
+            self.scope = scope
             os.makedirs(self.scope, exist_ok=True)
 
         if self.scope not in self.ctx:
@@ -59,34 +74,170 @@ class TransformUsage(Transform):
 
         return self.ctx[self.scope]
 
+    def collect(self, ast):
+        '''The usage nodes of a page in order, with the scope each runs in'''
+        usages = []
+        scope = None
+        coroutine = ast_walk(ast)
+        node = None
+        while node := coroutine.send(node):
+            if is_usage(node):
+                if node['data'].get('scope') is not None:
+                    scope = os.path.join('data', node['data']['scope'])
+                usages.append((scope, node))
+        return usages
+
+    def render(self, node):
+        return self.assemble(node, *self.render_output(node))
+
+    @staticmethod
+    def assemble(node, tabs, result):
+        '''The block of a usage node, from its interface tabs and results'''
+        tabset = md.tabset_ast(
+            *tabs,
+            md.tabitem_ast(node, '[View Source]', sync='raw')
+        )
+
+        return md.block_ast([tabset, *result])
+
+    def render_output(self, node):
+        '''The interface tabs and the results of a usage node'''
+        source = node['value']
+        tabs = []
+        self.error = None
+        try:
+            if self.scope is None:
+                raise Exception('No initial scope defined.')
+            exec_driver, drivers = self.ctx[self.scope]
+            exec_driver.exec_block(source)
+            result = exec_driver.render(flush=True)
+            for interface in drivers:
+                exec(source, interface['driver'].scope)
+                rendered = interface['driver'].render(flush=True)
+                if rendered is None:
+                    continue
+                tabs.append(md.tabitem_ast(rendered, interface['name'],
+                                           sync=interface['sync']))
+        except Exception:
+            self.error = traceback.format_exc()
+            result = [md.code_ast('python', self.error)]
+
+        return tabs, result
+
+    def render_scope(self, scope, nodes):
+        '''Render the usage nodes of one scope, in order
+
+        Blocks are reused from the `UsageCache` when neither their source nor
+        the blocks producing the variables they read changed. Before a block
+        has to run, the blocks it depends on are run again, as far as their
+        variables are not already bound, but unrelated blocks are not.
+        '''
+        if scope is None:
+            return [self.render(node) for node in nodes]
+
+        from q2doc.drivers.common import code_names
+        from .usage_cache import UsageCache
+        exec_driver, _ = self.setup_scope(scope)
+        cache = UsageCache(scope)
+
+        keys = []
+        inputs = []  # the variables each block reads, by their producer
+        writes = []
+        producers = {}
+        live = {}  # which block the variables in scope currently come from
+
+        def run(idx):
+            ran = len(exec_driver.lineage)
+            output = self.render_output(nodes[idx])
+            if len(exec_driver.lineage) > ran:
+                writes[idx] = exec_driver.lineage[-1]['writes']
+            live.update(dict.fromkeys(writes[idx], idx))
+            return output
+
+        def ensure(idx):
+            # bind what the block reads to the values of its producers
+            for _ in nodes:
+                stale = [dep for name, dep in inputs[idx].items()
+                         if live.get(name) != dep]
+                if not stale:
+                    return
+                ensure(min(stale))
+                run(min(stale))
+            # blocks rebinding the same variables kept undoing each other
+            for dep in range(idx):
+                run(dep)
+
+        blocks = []
+        for idx, node in enumerate(nodes):
+            source = node['value']
+            try:
+                reads = code_names(compile(source, '<usage>', 'exec'))
+            except SyntaxError:
+                reads = producers.keys()
+            inputs.append({name: producers[name]
+                           for name in reads if name in producers})
+            keys.append(cache.key(source, sorted(
+                (name, keys[dep]) for name, dep in inputs[idx].items())))
+            writes.append([])
+
+            # the node itself is not stored, it changes with its position
+            hit = cache.get(keys[idx])
+            if hit is not None:
+                output, writes[idx] = hit
+            else:
+                ensure(idx)
+                before = cache.snapshot()
+                output = run(idx)
+                # drafts reuse executed blocks, but are never stored for them
+                if self.error is None and not self.draft:
+                    cache.put(keys[idx], output, writes[idx], before)
+
+            producers.update(dict.fromkeys(writes[idx], idx))
+            blocks.append(self.assemble(node, *output))
+
+        return blocks
 
     def run(self, ast):
+        usages = self.collect(ast)
+
+        # scopes share no state, so each one can run in its own process
+        scopes = {}
+        for scope, node in usages:
+            scopes.setdefault(scope, []).append(node)
+        tasks = list(scopes.items())
+
+        # this process runs in the slot of the transform, every further
+        # worker needs a free slot of its own or the scopes share fewer
+        from q2doc.util import map_tasks
+        from . import _spare_slots, _n_slots
+        with _spare_slots(self.name, _n_slots(), len(tasks) - 1) as spare:
+            if spare:
+                warm_drivers()
+            rendered = map_tasks(_render_scope, tasks, jobs=spare + 1)
+        rendered = {scope: iter(blocks)
+                    for (scope, _), blocks in zip(tasks, rendered)}
+
         coroutine = ast_walk(ast)
         node = None
+        idx = 0
         while node := coroutine.send(node):
             if is_usage(node):
-                source = node['value']
-                tabs = []
-                try:
-                    exec_driver, drivers = self.setup_scope(node)
-                    exec(source, exec_driver.scope)
-                    result = exec_driver.render(flush=True)
-                    for interface in drivers:
-                        exec(source, interface['driver'].scope)
-                        rendered = interface['driver'].render(flush=True)
-                        if rendered is None:
-                            continue
-                        tabs.append(md.tabitem_ast(rendered, interface['name'],
-                                                   sync=interface['sync']))
-                except Exception:
-                    result = [md.code_ast('python', traceback.format_exc())]
-
-
-                tabset = md.tabset_ast(
-                    *tabs,
-                    md.tabitem_ast(node, '[View Source]', sync='raw')
-                )
-
-                node = md.block_ast([tabset, *result])
-
-        return ast
\ No newline at end of file
+                node = next(rendered[usages[idx][0]])
+                idx += 1
+
+        return ast
+
+
+def warm_drivers():
+    '''Load what every scope needs before forking a process per scope'''
+    from qiime2.sdk import PluginManager
+    import q2doc.drivers.execution  # noqa: F401
+    import q2doc.drivers.q2cli  # noqa: F401
+    import q2doc.drivers.python  # noqa: F401
+    import q2doc.drivers.r  # noqa: F401
+
+    PluginManager()
+
+
+def _render_scope(scope, nodes):
+    return TransformUsage().render_scope(scope, nodes)
@@ -0,0 +1,197 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import functools
+
+# the oldest blocks are dropped once the stored ones take more than this
+MAX_BYTES = 2 * 1024 ** 3
+# of what is stored for a block, entries of any other are never found
+_FORMAT = 2
+# how long a build may take to store a block, and between two prunings
+_PRUNE_INTERVAL = 60 * 60
+
+
+def _root():
+    from q2doc.cache import get_app_dir
+    return os.path.join(get_app_dir(), 'usage')
+
+
+@functools.lru_cache(maxsize=None)
+def _manifest():
+    from q2doc.cache import _get_distro_versions
+    base_url = (os.environ.get('BASE_URL'),
+                os.environ.get('READTHEDOCS_CANONICAL_URL'))
+    return json.dumps([_get_distro_versions(), base_url])
+
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts).encode('utf8')).hexdigest()
+
+
+def _snapshot(dir):
+    '''The files under ``dir``, by relative path, with their mtime and size'''
+    files = {}
+    for dirpath, _, filenames in os.walk(dir):
+        for fn in filenames:
+            path = os.path.join(dirpath, fn)
+            stat = os.lstat(path)
+            files[os.path.relpath(path, dir)] = (stat.st_mtime_ns,
+                                                 stat.st_size)
+    return files
+
+
+def _remove(path):
+    '''Remove a directory, after moving it where no reader looks for it'''
+    tmp = tempfile.mkdtemp(prefix='tmp-', dir=_root())
+    try:
+        os.rename(path, os.path.join(tmp, 'entry'))
+    except OSError:
+        pass
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def prune(max_bytes=MAX_BYTES):
+    '''Drop the least recently used blocks until the rest fit ``max_bytes``
+
+    Also removes what builds left behind when they did not finish storing
+    a block.
+    '''
+    import time
+
+    root = _root()
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    entries = []
+    for shard in os.scandir(root):
+        if not shard.is_dir(follow_symlinks=False):
+            continue
+        try:
+            if shard.name.startswith('tmp-'):
+                if shard.stat().st_mtime < now - _PRUNE_INTERVAL:
+                    shutil.rmtree(shard.path, ignore_errors=True)
+                continue
+            for entry in os.scandir(shard.path):
+                size = sum(stat[1] for stat in _snapshot(entry.path).values())
+                entries.append((entry.stat().st_mtime, size, entry.path))
+        except OSError:
+            # removed by another build while this one looked
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def clear():
+    '''Drop every stored block'''
+    root = _root()
+    if not os.path.isdir(root):
+        return
+    for shard in os.scandir(root):
+        if shard.is_dir(follow_symlinks=False):
+            _remove(shard.path)
+
+
+def _maybe_prune(root):
+    '''Prune at most once per interval, across all builds'''
+    import time
+
+    stamp = os.path.join(root, 'pruned')
+    try:
+        if os.stat(stamp).st_mtime > time.time() - _PRUNE_INTERVAL:
+            return
+    except FileNotFoundError:
+        pass
+    with open(stamp, 'w'):
+        pass
+    prune()
+
+
+class UsageCache:
+    '''The output of the usage blocks of one scope, with the data files
+    they wrote
+
+    The output is the interface tabs and the results of a block. The block
+    around them is made from the current node, which moves between builds.
+
+    Entries are addressed by a key over the scope, the installed versions,
+    the source of the block and the keys of the blocks producing the
+    variables it reads, so a block is only reused while all it depends on
+    is unchanged.
+    '''
+    def __init__(self, scope):
+        self.scope = scope
+        self.root = _root()
+        self.base = _digest(_FORMAT, _manifest(), scope)
+
+    def key(self, source, inputs):
+        '''The key of a block, ``inputs`` pairs each variable it reads with
+        the key of the block producing it'''
+        return _digest(self.base, source, inputs)
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        '''The output stored under ``key`` and the variables it wrote
+
+        Restores the data files of the block. When they cannot all be
+        restored, the block is a miss and runs again.
+        '''
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, 'block.json')) as fh:
+                stored = json.load(fh)
+
+            files = os.path.join(entry, 'files')
+            for dirpath, _, filenames in os.walk(files):
+                target = os.path.join(self.scope,
+                                      os.path.relpath(dirpath, files))
+                os.makedirs(target, exist_ok=True)
+                for fn in filenames:
+                    dst = os.path.join(target, fn)
+                    if os.path.lexists(dst):
+                        os.remove(dst)
+                    shutil.copy2(os.path.join(dirpath, fn), dst,
+                                 follow_symlinks=False)
+            # pruning drops the blocks least recently used first
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return stored['output'], stored['writes']
+
+    def snapshot(self):
+        return _snapshot(self.scope)
+
+    def put(self, key, output, writes, before):
+        '''Store the output of a block and the files it changed since the
+        ``before`` snapshot'''
+        os.makedirs(self.root, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='tmp-', dir=self.root)
+        try:
+            after = _snapshot(self.scope)
+            for path, stat in after.items():
+                if before.get(path) == stat:
+                    continue
+                dst = os.path.join(tmp, 'files', path)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copy2(os.path.join(self.scope, path), dst,
+                             follow_symlinks=False)
+            with open(os.path.join(tmp, 'block.json'), 'w') as fh:
+                json.dump(dict(output=output, writes=writes), fh)
+
+            entry = self._entry(key)
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            os.rename(tmp, entry)
+            _maybe_prune(self.root)
+        except OSError:
+            # another build stored it first, or the cache is not writable
+            pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
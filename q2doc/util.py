@@ -0,0 +1,21 @@
+import os
+
+
+def map_tasks(func, tasks, jobs=None):
+    '''Apply ``func`` to every tuple of arguments in ``tasks``
+
+    Runs in forked worker processes, which start with the parent's loaded
+    PluginManager, unless there is only one job or one task.
+    '''
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(tasks))
+    if jobs <= 1:
+        return [func(*task) for task in tasks]
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(jobs, mp_context=context) as pool:
+        return list(pool.map(func, *zip(*tasks)))